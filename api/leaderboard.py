@@ -0,0 +1,122 @@
+import asyncio
+import json
+from bisect import insort, bisect_left
+
+
+def format_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, separators=(',', ':'))}\n\n"
+
+
+class LeaderboardBroadcaster:
+    # every season's ranking kept sorted in memory; a score write that changes the top-N
+    # is pushed once per connected display through its own queue instead of every display polling /get-score.
+    def __init__(self, size=10, queue_size=64):
+        self.size = size
+        self.queue_size = queue_size
+        self.rankings = {}
+        self.subscribers = {}
+
+    def load(self, scores):
+        self.rankings = {}
+        for row in scores:
+            insort(self.rankings.setdefault(row.season, []), (-row.score, row.id, row.time, row.action))
+
+    def top(self, season):
+        return self.ranking(season, self.size)
+
+    def ranking(self, season, limit=None):
+        return [{"rank": rank, "id": player_id, "score": -negative_score, "time": time, "action": action}
+                for rank, (negative_score, player_id, time, action)
+                in enumerate(self.rankings.get(season, [])[:limit], 1)]
+
+    def update_score(self, player_id, previous, season, time, action, score):
+        # previous is the (season, time, action, score) the row held before it was overwritten
+        if previous:
+            previous_season, previous_time, previous_action, previous_score = previous
+            before = self.top(previous_season)
+            ranking = self.rankings.get(previous_season, [])
+            entry = (-previous_score, player_id, previous_time, previous_action)
+            index = bisect_left(ranking, entry)
+            if index < len(ranking) and ranking[index] == entry:
+                del ranking[index]
+            if previous_season != season:
+                self.publish(previous_season, before)
+                before = self.top(season)
+        else:
+            before = self.top(season)
+        insort(self.rankings.setdefault(season, []), (-score, player_id, time, action))
+        self.publish(season, before)
+
+    def remove_scores(self, rows):
+        # rows are (player_id, season, time, action, score) of deleted scores, every season is published once
+        removed = {}
+        for player_id, season, time, action, score in rows:
+            removed.setdefault(season, []).append((-score, player_id, time, action))
+        for season, entries in removed.items():
+            before = self.top(season)
+            ranking = self.rankings.get(season, [])
+            for entry in entries:
+                index = bisect_left(ranking, entry)
+                if index < len(ranking) and ranking[index] == entry:
+                    del ranking[index]
+            self.publish(season, before)
+
+    def publish(self, season, before):
+        after = self.top(season)
+        if before == after:
+            return
+        previous_entries = {entry["rank"]: entry for entry in before}
+        self.notify(season, "delta", {
+            "season": season,
+            "entries": [entry for entry in after if previous_entries.get(entry["rank"]) != entry],
+            "removed": sorted({entry["id"] for entry in before} - {entry["id"] for entry in after}),
+            "size": len(after),
+        })
+
+    def notify(self, season, event, data):
+        # encoded once, however many displays of the season are connected
+        message = format_event(event, data)
+        for queue in tuple(self.subscribers.get(season, ())):
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                # a display that stopped reading is dropped, it gets a fresh snapshot when it reconnects
+                self.unsubscribe(season, queue)
+                queue.get_nowait()
+                queue.put_nowait(None)
+
+    def subscribe(self, season):
+        queue = asyncio.Queue(self.queue_size)
+        self.subscribers.setdefault(season, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, season, queue):
+        self.subscribers.get(season, set()).discard(queue)
+
+    def close(self):
+        for queues in self.subscribers.values():
+            for queue in queues:
+                if queue.full():
+                    queue.get_nowait()
+                queue.put_nowait(None)
+        self.subscribers = {}
+
+    async def stream(self, season, request, keepalive=15, lifetime=300):
+        # uvicorn waits for open responses before shutting down, so every stream ends after `lifetime`
+        # seconds and EventSource reconnects on its own after the retry delay
+        queue = self.subscribe(season)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + lifetime
+        try:
+            yield "retry: 3000\n" + format_event("snapshot", {"season": season, "entries": self.top(season)})
+            while loop.time() < deadline and not await request.is_disconnected():
+                try:
+                    message = await asyncio.wait_for(queue.get(), min(keepalive, max(deadline - loop.time(), 0)))
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                if message is None:
+                    break
+                yield message
+        finally:
+            self.unsubscribe(season, queue)
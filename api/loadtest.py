@@ -0,0 +1,168 @@
+import logging
+import os
+import socket
+import sys
+import tempfile
+import threading
+from argparse import ArgumentParser
+from collections import defaultdict, Counter
+from random import Random
+from time import perf_counter, sleep
+
+import requests
+
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = Counter()
+
+    def record(self, endpoint, latency, error=None):
+        with self.lock:
+            self.latencies[endpoint].append(latency)
+            if error:
+                self.errors[(endpoint, error)] += 1
+
+    def add_server_error(self, message):
+        with self.lock:
+            self.errors[("server", message)] += 1
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+class ServerErrorCollector(logging.Handler):
+    # catches the exceptions uvicorn logs for 500 responses, e.g. "database is locked"
+    def __init__(self, stats):
+        super().__init__(logging.ERROR)
+        self.stats = stats
+
+    def emit(self, record):
+        if record.exc_info:
+            exception = record.exc_info[1]
+            self.stats.add_server_error(f"{type(exception).__name__}: {str(exception).splitlines()[0]}")
+
+
+def call(session, stats, method, base_url, endpoint, params):
+    start = perf_counter()
+    error = None
+    try:
+        res = session.request(method, base_url + endpoint, params=params, timeout=30)
+        if res.status_code >= 400:
+            error = f"HTTP {res.status_code}"
+    except requests.RequestException as e:
+        error = type(e).__name__
+    stats.record(endpoint, perf_counter() - start, error)
+    return None if error else res
+
+
+def kiosk(base_url, key, stats, rounds, play_time, seed, stop):
+    # the same request order as IDMenuTransition -> MenuScene -> ResultScene
+    rng = Random(seed)
+    with requests.Session() as session:
+        for _ in range(rounds):
+            if stop.is_set():
+                return
+            player_id = rng.randint(1, 3) * 10000 + rng.randint(1, 10) * 100 + rng.randint(1, 30)
+            call(session, stats, "GET", base_url, "/check", None)
+            call(session, stats, "GET", base_url, "/get-playcount", {"player_id": player_id})
+            sleep(play_time * rng.uniform(0.5, 1.5))
+            res = call(session, stats, "GET", base_url, "/get-season", None)
+            season = res.json()["season"] if res else 1
+            time_score = rng.randint(1000, 60000)
+            action_score = rng.randint(0, 20) * 2000
+            call(session, stats, "PUT", base_url, "/put-score", {
+                "player_id": player_id, "key": key, "season": season,
+                "time": time_score, "action": action_score, "score": time_score + action_score})
+            call(session, stats, "PUT", base_url, "/put-playcount", {"player_id": player_id, "key": key})
+
+
+def ranking_display(base_url, stats, interval, stop):
+    with requests.Session() as session:
+        while not stop.is_set():
+            call(session, stats, "GET", base_url, "/get-score", {"season": 1})
+            stop.wait(interval)
+
+
+def start_local_server(stats):
+    # runs api/main.py with uvicorn in this process, against a throwaway database
+    import uvicorn
+
+    os.chdir(tempfile.mkdtemp(prefix="dodge-loadtest-"))
+    # every simulated kiosk connects from 127.0.0.1, a per-client rate limit would throttle them as one
+    os.environ.setdefault("RATE_LIMIT_RATE", "0")
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import main
+
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=port, log_level="error",
+                                           access_log=False))
+    logging.getLogger("uvicorn.error").addHandler(ServerErrorCollector(stats))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        sleep(0.05)
+    return f"http://127.0.0.1:{port}", main.auth_key, server
+
+
+def main():
+    parser = ArgumentParser(description="DodgeGame API load test")
+    parser.add_argument("--url", help="target server, an in-process server is started when omitted")
+    parser.add_argument("--key", default="", help="auth key of the target server")
+    parser.add_argument("--kiosks", type=int, default=20)
+    parser.add_argument("--rounds", type=int, default=10, help="games played per kiosk")
+    parser.add_argument("--play-time", type=float, default=0.5, help="mean seconds between menu and result")
+    parser.add_argument("--displays", type=int, default=5, help="ranking pages polling /get-score")
+    parser.add_argument("--poll-interval", type=float, default=1.0)
+    args = parser.parse_args()
+
+    stats = Stats()
+    server = None
+    if args.url:
+        base_url, key = args.url.rstrip("/"), args.key
+    else:
+        base_url, key, server = start_local_server(stats)
+
+    stop = threading.Event()
+    displays = [threading.Thread(target=ranking_display, args=(base_url, stats, args.poll_interval, stop))
+                for _ in range(args.displays)]
+    kiosks = [threading.Thread(target=kiosk, args=(base_url, key, stats, args.rounds, args.play_time, seed, stop))
+              for seed in range(args.kiosks)]
+    started = perf_counter()
+    for thread in displays + kiosks:
+        thread.start()
+    try:
+        for thread in kiosks:
+            thread.join()
+    except KeyboardInterrupt:
+        pass
+    stop.set()
+    for thread in displays:
+        thread.join()
+    duration = perf_counter() - started
+    if server:
+        server.should_exit = True
+
+    total = sum(len(values) for values in stats.latencies.values())
+    print(f"{args.kiosks} kiosks, {args.displays} displays, {duration:.1f}s, "
+          f"{total} requests, {total / duration:.1f} req/s")
+    print(f"{'endpoint':16} {'count':>7} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'max ms':>9} {'errors':>7}")
+    for endpoint, values in sorted(stats.latencies.items()):
+        values.sort()
+        errors = sum(count for (name, _), count in stats.errors.items() if name == endpoint)
+        print(f"{endpoint:16} {len(values):7} {percentile(values, 0.5) * 1000:9.1f} {percentile(values, 0.9) * 1000:9.1f} "
+              f"{percentile(values, 0.99) * 1000:9.1f} {values[-1] * 1000:9.1f} {errors:7}")
+    if stats.errors:
+        print("errors:")
+        for (endpoint, error), count in stats.errors.most_common():
+            print(f"  {count:6} {endpoint} {error}")
+
+
+if __name__ == "__main__":
+    main()
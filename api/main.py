@@ -1,12 +1,39 @@
-from fastapi import FastAPI, Depends, Query, HTTPException
+from fastapi import FastAPI, Depends, Query, Body, HTTPException, Request
+from fastapi.responses import StreamingResponse, HTMLResponse, RedirectResponse
+from fastapi.staticfiles import StaticFiles
 import sqlalchemy as db
 
-from secrets import token_hex
+from secrets import token_hex, compare_digest
+from functools import partial
+from os import environ
+from pathlib import Path
+from typing import List
+from urllib.parse import parse_qs, urlencode
+import json
 
 from sqlalchemy.orm import declarative_base, sessionmaker
 
+try:
+    # much faster for long score lists, the standard json module is used when it is not installed
+    import orjson
+
+    def dumps(value):
+        return orjson.dumps(value)
+except ImportError:
+    def dumps(value):
+        return json.dumps(value, separators=(",", ":")).encode()
+
 from playcount_model import PlayCountResponseModel
 from score_model import SingleScoreResponseModel, ScoreListResponseModel
+from stats_model import StatsResponseModel
+from stats import ScoreStats
+from leaderboard import LeaderboardBroadcaster
+from pages import RankingPages, render_admin
+from middleware import RateLimiter, SingleFlight, logger, start_logging
+import replay_verifier
+
+# stylesheet of the ranking and admin pages, kept with the rest of the web files in the repository
+STATIC_DIR = Path(__file__).parent.parent / "webapp" / "admin_webapp" / "static"
 
 auth_key = token_hex(20)
 with open("auth.txt", "w", encoding="utf-8") as f:
@@ -15,6 +42,19 @@ print("PRIVATE AUTH KEY:", auth_key)
 
 app = FastAPI(title="부평고 2022 코딩 동아리", description="2022년도 부평고등학교 코딩 동아리에서 만든 게임에 쓰이는 백엔드 API입니다.", docs_url=None,
               redoc_url="/docs")
+app.mount("/static", StaticFiles(directory=STATIC_DIR, check_dir=False), name="static")
+# the last middleware added runs first: requests over a client's rate are refused before anything else,
+# identical reads in flight at the same time share one response.
+# /get-score streams whole seasons and is left out, coalescing would hold the full export in memory.
+# RATE_LIMIT_TRUSTED_PROXIES lists reverse proxy addresses whose X-Forwarded-For is believed
+app.add_middleware(SingleFlight, paths=("/check", "/get-season", "/get-playcount", "/get-stats", "/get-replay-check"))
+app.add_middleware(RateLimiter, rate=float(environ.get("RATE_LIMIT_RATE", 10)),
+                   burst=int(environ.get("RATE_LIMIT_BURST", 40)),
+                   exempt=("/put-score", "/put-playcount", "/put-playcount-any", "/set-season", "/reset-playcounts",
+                           "/remove-scores", "/admin", "/ranking", "/leaderboard-stream"),
+                   exempt_prefixes=("/static/",),
+                   trusted_proxies=environ.get("RATE_LIMIT_TRUSTED_PROXIES", "").replace(",", " ").split())
+log_listener = start_logging()
 
 engine = db.create_engine("sqlite:///db.sqlite3")
 connection = engine.connect()
@@ -34,21 +74,50 @@ class Score(base):
     time = db.Column(db.Integer)
 
 
+# stream_scores reads the table in this order a chunk at a time
+score_order = db.Index("ix_score_order", Score.score.desc(), Score.id)
+
+
 class Playcount(base):
     __tablename__ = "playcount"
     id = db.Column(db.Integer, primary_key=True)
     count = db.Column(db.Integer)
 
 
+class ReplayCheck(base):
+    __tablename__ = "replay_check"
+    id = db.Column(db.Integer, primary_key=True)
+    player_id = db.Column(db.Integer, index=True)
+    season = db.Column(db.Integer)
+    status = db.Column(db.String)
+    detail = db.Column(db.String)
+    time = db.Column(db.Integer)
+    action = db.Column(db.Integer)
+    score = db.Column(db.Integer)
+
+
 base.metadata.create_all(engine)
+# create_all only adds indexes along with new tables, databases from before the index get it here
+score_order.create(engine, checkfirst=True)
+
+stats = ScoreStats()
+leaderboard = LeaderboardBroadcaster()
+pages = RankingPages(leaderboard, stats)
+
+
+@app.on_event("startup")
+def load_stats():
+    with Session() as session:
+        scores = session.query(Score).all()
+        stats.load(scores, session.query(Playcount).all())
+        leaderboard.load(scores)
 
 
-async def auth(key: str = Query(..., title="보안 키")):
-    print(str(auth_key)+",", "Type: "+str(type(auth_key)))
-    print(key+",", "Type: "+str(type(key)))
-    if key == str(auth_key):
+async def auth(request: Request, key: str = Query(..., title="보안 키")):
+    if compare_digest(key.encode(), auth_key.encode()):
         return {"error": False, "key": key}
     else:
+        logger.warning("wrong auth key from %s for %s", request.client.host if request.client else "", request.url.path)
         return {"error": True, "obj": HTTPException(status_code=403, detail="보안 키가 올바르지 않습니다.")}
 
 
@@ -65,39 +134,124 @@ async def get_score(player_id: str = Query(None, title="학번", description="
                 return {"key": player_id, "time_score": -1, "action_score": -1, "overall_score": -1}
             data = session.query(Score).filter(Score.id == player_id).first()
             return SingleScoreResponseModel(id=player_id, season=data.season, score=data.score, action=data.action, time=data.time)
-        else:
-            if season:
-                data = session.query(Score).filter(Score.season == season).order_by(Score.score.desc()).all()
-                return ScoreListResponseModel(scores=[SingleScoreResponseModel(id=i.id, season=i.season, score=i.score, action=i.action, time=i.time) for i in data])
-            else:
-                data = session.query(Score).order_by(Score.score.desc()).all()
-                return ScoreListResponseModel(scores=[SingleScoreResponseModel(id=i.id, season=i.season, score=i.score, action=i.action, time=i.time) for i in data])
+    # lists skip response_model validation, the rows are already in the ScoreListResponseModel shape
+    return StreamingResponse(stream_scores(season), media_type="application/json")
+
+
+SCORE_COLUMNS = ("id", "season", "time", "action", "score")
+
+
+async def stream_scores(season=None, chunk_size=500):
+    # rows are fetched as plain tuples and encoded a chunk at a time,
+    # so a full export never holds the table as ORM or pydantic objects.
+    # every chunk is its own short read that continues after the last (score, id) sent,
+    # a slow client never keeps a read open on the database between chunks
+    query = (db.select(Score.id, Score.season, Score.time, Score.action, Score.score)
+             .order_by(Score.score.desc(), Score.id).limit(chunk_size))
+    if season:
+        query = query.where(Score.season == season)
+    yield b'{"scores":['
+    chunk = query
+    separator = b""
+    while True:
+        with engine.connect() as conn:
+            rows = conn.execute(chunk).fetchall()
+        if not rows:
+            break
+        yield separator + dumps([dict(zip(SCORE_COLUMNS, row)) for row in rows])[1:-1]
+        separator = b","
+        if len(rows) < chunk_size:
+            break
+        last_id, last_score = rows[-1][0], rows[-1][4]
+        chunk = query.where(db.or_(Score.score < last_score, db.and_(Score.score == last_score, Score.id > last_id)))
+    yield b"]}"
+
+
+def save_replay_check(player_id, season, future):
+    try:
+        result = future.result()
+    except Exception as e:
+        result = {"status": "error", "detail": f"{type(e).__name__}: {e}"}
+    simulated = result.get("simulated", {})
+    with Session() as session:
+        session.add(ReplayCheck(player_id=player_id, season=season, status=result["status"], detail=result["detail"],
+                                time=simulated.get("time"), action=simulated.get("action"),
+                                score=simulated.get("score")))
+        session.commit()
+    if result["status"] != "ok":
+        logger.warning("replay check failed: %s %s %s", player_id, result["status"], result["detail"])
 
 
 @app.put("/put-score",
          summary="점수 저장",
          status_code=201,
          response_model=SingleScoreResponseModel,
-         description="학번을 기반으로 점수를 저장합니다. 학번이 이미 존재할 경우 기존 점수를 덮어씁니다.")
+         description="학번을 기반으로 점수를 저장합니다. 학번이 이미 존재할 경우 기존 점수를 덮어씁니다. "
+                     "리플레이가 함께 전송되면 백그라운드에서 점수를 검증합니다.")
 async def put_score(auth: dict = Depends(auth),
                     season: int = Query(..., title="회차"),
                     player_id: int = Query(..., title="학번"),
                     time: int = Query(..., title="시간 점수"),
                     action: int = Query(..., title="액션 점수"),
-                    score: int = Query(..., title="점수 합계")):
+                    score: int = Query(..., title="점수 합계"),
+                    replay: str = Body(None, embed=True, title="리플레이")):
     if auth["error"]:
         raise auth["obj"]
     with Session() as session:
         data = session.query(Score).filter(Score.id == player_id).first()
         if data:
+            previous = (data.season, data.time, data.action, data.score)
             data.time = time
             data.action = action
             data.score = score
         else:
+            previous = None
             data = Score(id=player_id, season=season, time=time, action=action, score=score)
             session.add(data)
         session.commit()
-        return SingleScoreResponseModel(id=player_id, season=season, time=time, action=action, score=score)
+        if previous:
+            stats.replace_score(player_id, previous, data.season, time, action, score)
+        else:
+            stats.add_score(player_id, season, time, action, score)
+        leaderboard.update_score(player_id, previous, data.season, time, action, score)
+        pages.invalidate(data.season)
+        if previous and previous[0] != data.season:
+            pages.invalidate(previous[0])
+    if replay:
+        replay_verifier.submit(replay, time, action, score, partial(save_replay_check, player_id, season))
+    return SingleScoreResponseModel(id=player_id, season=season, time=time, action=action, score=score)
+
+
+@app.get("/get-replay-check",
+         summary="리플레이 검증 결과 가져오기",
+         status_code=200,
+         description="학번을 기반으로 리플레이 검증 결과를 가져옵니다.")
+async def get_replay_check(player_id: int = Query(..., title="학번")):
+    with Session() as session:
+        data = session.query(ReplayCheck).filter(ReplayCheck.player_id == player_id).order_by(ReplayCheck.id.desc()).all()
+        return {"checks": [{"season": i.season, "status": i.status, "detail": i.detail,
+                            "time": i.time, "action": i.action, "score": i.score} for i in data]}
+
+
+@app.get("/leaderboard-stream",
+         summary="실시간 순위 받기",
+         status_code=200,
+         description="회차의 상위 순위를 Server-Sent Events로 받습니다. 연결 직후 snapshot 이벤트로 전체 상위 순위를, "
+                     "이후에는 점수 저장으로 상위 순위가 바뀔 때마다 delta 이벤트로 바뀐 순위만 받습니다. "
+                     "상위 순위와 상관없이 회차의 점수가 저장되거나 삭제될 때마다 update 이벤트도 받습니다.")
+async def leaderboard_stream(request: Request,
+                             requested_season: int = Query(None, alias="season", title="회차",
+                                                           description="순위를 받을 회차")):
+    return StreamingResponse(leaderboard.stream(requested_season or season, request),
+                             media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.on_event("shutdown")
+def shutdown_replay_verifier():
+    replay_verifier.shutdown()
+    leaderboard.close()
+    log_listener.stop()
 
 
 @app.get("/get-playcount",
@@ -112,6 +266,7 @@ async def get_playcount(player_id: int = Query(..., title="학번")):
             data = Playcount(id=player_id, count=0)
             session.add(data)
             session.commit()
+            stats.set_playcount(player_id, 0)
         return PlayCountResponseModel(id=player_id, count=data.count)
 
 
@@ -129,10 +284,10 @@ async def put_playcount(auth: dict = Depends(auth),
         if data:
             data.count = data.count + 1
         else:
-            print("Here!")
             data = Playcount(id=player_id, count=1)
             session.add(data)
         session.commit()
+        stats.set_playcount(player_id, data.count)
         return PlayCountResponseModel(id=player_id, count=data.count)
 
 
@@ -154,9 +309,20 @@ async def put_playcount_any(auth: dict = Depends(auth),
             data = Playcount(id=player_id, count=count)
             session.add(data)
         session.commit()
+        stats.set_playcount(player_id, data.count)
         return PlayCountResponseModel(id=player_id, count=data.count)
 
 
+@app.get("/get-stats",
+         summary="통계 가져오기",
+         status_code=200,
+         response_model=StatsResponseModel,
+         description="회차별 점수 통계(평균, 백분위수, 분포, 학년/반별 통계)와 플레이 횟수 분포를 가져옵니다. "
+                     "회차를 입력하지 않을 경우 현재 회차의 통계를 가져옵니다.")
+async def get_stats(requested_season: int = Query(None, alias="season", title="회차", description="통계를 가져올 회차")):
+    return stats.summary(requested_season or season)
+
+
 @app.get("/get-season",
          summary="회차 가져오기",
          status_code=200,
@@ -173,10 +339,130 @@ async def get_season():
 async def set_season(auth: dict = Depends(auth),
                      updated_season: int = Query(...), title="회차"):
     global season
+    if auth["error"]:
+        raise auth["obj"]
     season = updated_season
     return {"season": season}
 
 
+def reset_playcounts_of(player_ids=None):
+    # one UPDATE for the whole selection, no player_ids resets everyone
+    with Session() as session:
+        query = session.query(Playcount)
+        if player_ids:
+            query = query.filter(Playcount.id.in_(player_ids))
+        reset = [row.id for row in query.with_entities(Playcount.id)]
+        query.update({Playcount.count: 0}, synchronize_session=False)
+        session.commit()
+    for player_id in reset:
+        stats.set_playcount(player_id, 0)
+    return len(reset)
+
+
+def remove_scores_of(player_ids=None, removed_season=None):
+    # one DELETE for the whole selection, the in-memory rankings and cached pages follow once per season
+    with Session() as session:
+        query = session.query(Score)
+        if player_ids:
+            query = query.filter(Score.id.in_(player_ids))
+        if removed_season:
+            query = query.filter(Score.season == removed_season)
+        rows = [tuple(row) for row in query.with_entities(Score.id, Score.season, Score.time, Score.action, Score.score)]
+        query.delete(synchronize_session=False)
+        session.commit()
+    for row in rows:
+        stats.remove_score(*row)
+    leaderboard.remove_scores(rows)
+    for removed_season in {row[1] for row in rows}:
+        pages.invalidate(removed_season)
+    return len(rows)
+
+
+@app.put("/reset-playcounts",
+         summary="플레이 횟수 일괄 초기화",
+         status_code=201,
+         description="학번 목록의 플레이 횟수를 한 번에 0으로 초기화합니다. 학번 목록을 보내지 않을 경우 모든 플레이 횟수를 초기화합니다.")
+async def reset_playcounts(auth: dict = Depends(auth),
+                           player_ids: List[int] = Body(None, embed=True, title="학번 목록")):
+    if auth["error"]:
+        raise auth["obj"]
+    return {"reset": reset_playcounts_of(player_ids)}
+
+
+@app.put("/remove-scores",
+         summary="점수 일괄 삭제",
+         status_code=201,
+         description="학번 목록 또는 회차의 점수를 한 번에 삭제합니다. 둘 다 주어지면 해당 회차의 학번 목록만 삭제합니다.")
+async def remove_scores(auth: dict = Depends(auth),
+                        removed_season: int = Query(None, alias="season", title="회차"),
+                        player_ids: List[int] = Body(None, embed=True, title="학번 목록")):
+    if auth["error"]:
+        raise auth["obj"]
+    if not player_ids and not removed_season:
+        raise HTTPException(status_code=400, detail="삭제할 학번 목록이나 회차를 입력하세요.")
+    return {"removed": remove_scores_of(player_ids, removed_season)}
+
+
+@app.get("/ranking",
+         summary="랭킹 페이지",
+         response_class=HTMLResponse,
+         description="회차의 전체 순위를 HTML 페이지로 가져옵니다. 페이지는 회차별로 캐시되고 점수가 저장되면 다시 만들어집니다.")
+async def ranking_page(request: Request,
+                       requested_season: int = Query(None, alias="season", title="회차",
+                                                     description="순위를 볼 회차")):
+    return pages.response(requested_season or season, request)
+
+
+@app.get("/admin",
+         summary="관리자 페이지",
+         response_class=HTMLResponse,
+         description="회차 변경, 플레이 횟수 초기화, 점수 삭제를 할 수 있는 관리자 페이지입니다.")
+async def admin_page(auth: dict = Depends(auth),
+                     requested_season: int = Query(None, alias="season", title="회차"),
+                     message: str = Query(None, title="처리 결과")):
+    if auth["error"]:
+        raise auth["obj"]
+    selected_season = requested_season or season
+    seasons = [(number, len(stats.seasons[number].scores) if number in stats.seasons else 0)
+               for number in sorted(set(stats.seasons) | {season, selected_season})]
+    return render_admin(auth["key"], season, seasons, selected_season, leaderboard.ranking(selected_season), message)
+
+
+@app.post("/admin",
+          summary="관리자 작업",
+          response_class=RedirectResponse,
+          description="관리자 페이지의 폼을 처리하고 관리자 페이지로 돌아갑니다.")
+async def admin_action(request: Request, auth: dict = Depends(auth)):
+    global season
+    if auth["error"]:
+        raise auth["obj"]
+    # plain urlencoded forms, parsed here so that the api does not need python-multipart
+    form = parse_qs((await request.body()).decode())
+    action = form.get("action", [""])[0]
+    try:
+        selected_season = int(form.get("season", [season])[0])
+        player_ids = [int(player_id) for value in form.get("player_id", []) + form.get("player_ids", [])
+                      for player_id in value.replace(",", " ").split()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="회차와 학번은 숫자로 입력하세요.")
+    if action == "set-season":
+        season = selected_season
+        message = f"회차를 {season}회차로 변경했습니다."
+    elif action == "reset-playcounts":
+        message = f"플레이 횟수 {reset_playcounts_of(player_ids)}건을 초기화했습니다."
+    elif action == "remove-scores":
+        if form.get("whole_season"):
+            message = f"{selected_season}회차 점수 {remove_scores_of(removed_season=selected_season)}건을 삭제했습니다."
+        elif player_ids:
+            message = f"점수 {remove_scores_of(player_ids, selected_season)}건을 삭제했습니다."
+        else:
+            message = "삭제할 점수를 선택하세요."
+    else:
+        raise HTTPException(status_code=400, detail="알 수 없는 작업입니다.")
+    return RedirectResponse(f"/admin?{urlencode({'key': auth['key'], 'season': selected_season, 'message': message})}",
+                            status_code=303)
+
+
 @app.get("/check", status_code=200)
 async def checkalive():
     return {"alive": True}
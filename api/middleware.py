@@ -0,0 +1,120 @@
+import asyncio
+import logging
+from logging.handlers import QueueHandler, QueueListener
+from math import ceil
+from queue import SimpleQueue
+from time import monotonic
+
+from fastapi.responses import JSONResponse
+
+logger = logging.getLogger("dodge.api")
+
+
+def start_logging(level=logging.INFO):
+    # records are only put on a queue by the request, the listener thread does the slow stream writes
+    queue = SimpleQueue()
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
+    logger.addHandler(QueueHandler(queue))
+    logger.setLevel(level)
+    logger.propagate = False
+    listener = QueueListener(queue, handler)
+    listener.start()
+    return listener
+
+
+class RateLimiter:
+    # token bucket per client address: `burst` requests at once, refilled at `rate` per second.
+    # kiosks reconnecting together after a network drop are spread out instead of all reaching the database.
+    # a rate of 0 turns the limiter off
+    def __init__(self, app, rate, burst, max_clients=10000, exempt=(), exempt_prefixes=(), trusted_proxies=()):
+        self.app = app
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        # the authenticated writes are never refused, a score must not be lost to a busy moment,
+        # neither are the cached pages that every screen behind a school's address reloads together
+        self.exempt = frozenset(exempt)
+        self.exempt_prefixes = tuple(exempt_prefixes)
+        self.trusted_proxies = frozenset(trusted_proxies)
+        self.buckets = {}
+
+    def client_key(self, scope):
+        # the address alone, anything a client sends about itself could be changed to get a fresh bucket.
+        # behind a trusted reverse proxy it is the address the proxy appended to X-Forwarded-For
+        address = scope["client"][0] if scope.get("client") else ""
+        if address in self.trusted_proxies:
+            for name, value in scope["headers"]:
+                if name == b"x-forwarded-for":
+                    return value.decode("latin-1").split(",")[-1].strip()
+        return address
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self.rate <= 0 or scope["path"] in self.exempt \
+                or scope["path"].startswith(self.exempt_prefixes):
+            return await self.app(scope, receive, send)
+        client = self.client_key(scope)
+        now = monotonic()
+        tokens, last = self.buckets.get(client, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - last) * self.rate)
+        if tokens < 1:
+            self.buckets[client] = (tokens, now)
+            logger.warning("rate limited %s %s", client, scope["path"])
+            response = JSONResponse({"detail": "요청이 너무 많습니다. 잠시 후 다시 시도하세요."}, status_code=429,
+                                    headers={"Retry-After": str(ceil((1 - tokens) / self.rate))})
+            return await response(scope, receive, send)
+        self.buckets[client] = (tokens - 1, now)
+        if len(self.buckets) > self.max_clients:
+            self.prune(now)
+        await self.app(scope, receive, send)
+
+    def prune(self, now):
+        # a bucket that refilled completely is the same as no bucket. when too many are still refilling,
+        # only the most recently used half is kept, so that a flood of addresses prunes once per half table
+        self.buckets = {client: (tokens, last) for client, (tokens, last) in self.buckets.items()
+                        if tokens + (now - last) * self.rate < self.burst}
+        if len(self.buckets) > self.max_clients // 2:
+            recent = sorted(self.buckets.items(), key=lambda item: item[1][1])[-(self.max_clients // 2):]
+            self.buckets = dict(recent)
+
+
+class SingleFlight:
+    # identical GETs (same path and query) arriving while the first one is still running wait for its
+    # response instead of running the same query again. the response is held until it is complete, so only
+    # for small reads whose answer does not depend on headers, never for streamed ones
+    def __init__(self, app, paths):
+        self.app = app
+        self.paths = frozenset(paths)
+        self.flights = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "GET" or scope["path"] not in self.paths:
+            return await self.app(scope, receive, send)
+        key = (scope["path"], scope["query_string"])
+        flight = self.flights.get(key)
+        if flight is not None:
+            messages = await asyncio.shield(flight)
+            if messages is not None:
+                for message in messages:
+                    await send(message)
+                return
+            # the request being waited for failed, this one runs on its own
+
+        flight = self.flights[key] = asyncio.get_running_loop().create_future()
+        messages = []
+
+        async def capture(message):
+            messages.append(message)
+
+        try:
+            await self.app(scope, receive, capture)
+        except BaseException:
+            flight.set_result(None)
+            raise
+        else:
+            flight.set_result(messages)
+        finally:
+            if self.flights.get(key) is flight:
+                del self.flights[key]
+        for message in messages:
+            await send(message)
@@ -0,0 +1,133 @@
+from collections import OrderedDict
+from html import escape
+from secrets import token_hex
+import gzip
+
+from fastapi.responses import Response
+
+PAGE = """<!DOCTYPE html>
+<html lang="ko">
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<title>{title}</title>
+<link rel="stylesheet" href="/static/css/index.css">
+</head>
+<body class="{body_class}">
+{content}
+</body>
+</html>
+"""
+
+
+def score_rows(ranking, selectable=False):
+    rows = []
+    for entry in ranking:
+        checkbox = f'<td><input type="checkbox" name="player_id" value="{entry["id"]}"></td>' if selectable else ""
+        rows.append(f'<tr>{checkbox}<td class="rank">{entry["rank"]}</td><td>{entry["id"]}</td>'
+                    f'<td>{entry["time"]}</td><td>{entry["action"]}</td><td class="score">{entry["score"]}</td></tr>')
+    return "\n".join(rows)
+
+
+def score_table(ranking, selectable=False):
+    return (f'<table class="ranking"><thead><tr>{"<th></th>" if selectable else ""}'
+            '<th>순위</th><th>학번</th><th>시간 점수</th><th>액션 점수</th><th>총 점수</th></tr></thead>'
+            f'<tbody>\n{score_rows(ranking, selectable)}\n</tbody></table>')
+
+
+def render_ranking(season, ranking, summary):
+    content = f"""<header>
+<h1>부평고 2022 코딩동아리 게임 랭킹</h1>
+<p class="summary">{season}회차 · 참가 {summary["count"]}명 · 평균 {summary["mean"]["score"]} · 최고 {summary["best"]}</p>
+</header>
+<main>
+{score_table(ranking) if ranking else '<p class="empty">아직 기록이 없습니다.</p>'}
+</main>
+<script>
+// a projected page follows every score write of its season, reloading is cheap because the page is cached server-side
+new EventSource("/leaderboard-stream?season={season}").addEventListener("update", () => location.reload());
+</script>"""
+    return PAGE.format(title=f"{season}회차 랭킹", body_class="ranking-page", content=content)
+
+
+def render_admin(key, current_season, seasons, selected_season, ranking, message=None):
+    # every action posts back to /admin, which redirects here with a message
+    key = escape(key, quote=True)
+    season_links = " ".join(
+        f'<a href="/admin?key={key}&amp;season={number}"{" class=selected" if number == selected_season else ""}>'
+        f'{number}회차 ({count}명)</a>' for number, count in seasons)
+    content = f"""<header>
+<h1>관리자 페이지</h1>
+<p class="summary">현재 회차: {current_season}</p>
+{f'<p class="message">{escape(message)}</p>' if message else ''}
+</header>
+<main>
+<section>
+<h2>회차 변경</h2>
+<form method="post" action="/admin?key={key}">
+<input type="hidden" name="action" value="set-season">
+<input type="number" name="season" min="1" value="{current_season}" required>
+<button type="submit">변경</button>
+</form>
+</section>
+<section>
+<h2>플레이 횟수 초기화</h2>
+<form method="post" action="/admin?key={key}">
+<input type="hidden" name="action" value="reset-playcounts">
+<textarea name="player_ids" placeholder="학번을 공백이나 쉼표로 구분해 입력하세요. 비워 두면 전체 초기화됩니다."></textarea>
+<button type="submit">초기화</button>
+</form>
+</section>
+<section>
+<h2>점수 삭제</h2>
+<p class="seasons">{season_links}</p>
+<form method="post" action="/admin?key={key}&amp;season={selected_season}">
+<input type="hidden" name="action" value="remove-scores">
+<input type="hidden" name="season" value="{selected_season}">
+<label><input type="checkbox" name="whole_season" value="1"> {selected_season}회차 점수 전체 삭제</label>
+<button type="submit">선택한 점수 삭제</button>
+{score_table(ranking, selectable=True) if ranking else '<p class="empty">기록이 없습니다.</p>'}
+</form>
+</section>
+</main>"""
+    return PAGE.format(title="관리자 페이지", body_class="admin-page", content=content)
+
+
+class RankingPages:
+    # ranking pages rendered once per season and kept as ready-to-send bytes, plain and gzip,
+    # until a score write touches the season. projected screens revalidate with If-None-Match and get an empty 304.
+    # only the most recently shown `max_pages` seasons are kept, any season number can be asked for
+    def __init__(self, leaderboard, stats, max_pages=16):
+        self.leaderboard = leaderboard
+        self.stats = stats
+        self.max_pages = max_pages
+        self.cache = OrderedDict()
+        self.versions = {}
+        # etags of a previous server run never match
+        self.boot = token_hex(4)
+
+    def invalidate(self, season):
+        self.cache.pop(season, None)
+        self.versions[season] = self.versions.get(season, 0) + 1
+        # the page lists the whole ranking and the season summary, so it reloads on every write, not only on top-N deltas
+        self.leaderboard.notify(season, "update", {"season": season})
+
+    def page(self, season):
+        if season in self.cache:
+            self.cache.move_to_end(season)
+            return self.cache[season]
+        body = render_ranking(season, self.leaderboard.ranking(season), self.stats.summary(season)).encode()
+        self.cache[season] = (f'"{self.boot}-{season}-{self.versions.get(season, 0)}"', body, gzip.compress(body, 6))
+        if len(self.cache) > self.max_pages:
+            self.cache.popitem(last=False)
+        return self.cache[season]
+
+    def response(self, season, request):
+        etag, body, compressed = self.page(season)
+        headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers=headers)
+        if "gzip" in request.headers.get("accept-encoding", ""):
+            headers["Content-Encoding"] = "gzip"
+            body = compressed
+        return Response(body, media_type="text/html; charset=utf-8", headers=headers)
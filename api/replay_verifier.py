@@ -0,0 +1,48 @@
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+# the simulation rules live in the game's lib package, one directory up
+BASEDIR = Path(__file__).parent.parent.absolute()
+
+executor = None
+
+
+def verify_replay(replay, time, action, score):
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    if str(BASEDIR) not in sys.path:
+        sys.path.append(str(BASEDIR))
+    try:
+        from lib.simulation import simulate_replay
+    except ImportError as e:
+        return {"status": "unavailable", "detail": str(e)}
+
+    try:
+        simulated = simulate_replay(replay)
+    except Exception as e:
+        return {"status": "error", "detail": f"{type(e).__name__}: {e}"}
+
+    mismatches = [key for key, value in (("time", time), ("action", action), ("score", score))
+                  if simulated[key] != value]
+    if not simulated["finished"]:
+        mismatches.append("finished")
+    return {
+        "status": "mismatch" if mismatches else "ok",
+        "detail": ", ".join(mismatches),
+        "simulated": simulated
+    }
+
+
+def submit(replay, time, action, score, callback):
+    global executor
+    if executor is None:
+        executor = ProcessPoolExecutor(max_workers=int(os.environ.get("REPLAY_VERIFY_WORKERS", 1)))
+    future = executor.submit(verify_replay, replay, time, action, score)
+    future.add_done_callback(callback)
+    return future
+
+
+def shutdown():
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
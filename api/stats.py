@@ -0,0 +1,134 @@
+from bisect import insort, bisect_left
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def remove_sorted(sorted_values, value):
+    index = bisect_left(sorted_values, value)
+    if index < len(sorted_values) and sorted_values[index] == value:
+        del sorted_values[index]
+
+
+def student_groups(player_id):
+    # 5-digit student ids are <grade><class:2><number:2>
+    grade = player_id // 10000
+    return str(grade), f"{grade}-{player_id // 100 % 100}"
+
+
+class SeasonStats:
+    # one season's scores kept sorted so that percentiles never need a scan of the table
+    def __init__(self, bucket_size):
+        self.bucket_size = bucket_size
+        self.scores = []
+        self.totals = {"time": 0, "action": 0, "score": 0}
+        self.histogram = {}
+        self.grades = {}
+        self.classes = {}
+
+    def add(self, player_id, time, action, score, sign=1):
+        if sign > 0:
+            insort(self.scores, score)
+        else:
+            remove_sorted(self.scores, score)
+        self.totals["time"] += sign * time
+        self.totals["action"] += sign * action
+        self.totals["score"] += sign * score
+        bucket = score // self.bucket_size
+        self.histogram[bucket] = self.histogram.get(bucket, 0) + sign
+        if not self.histogram[bucket]:
+            del self.histogram[bucket]
+        grade, student_class = student_groups(player_id)
+        for groups, key in ((self.grades, grade), (self.classes, student_class)):
+            group = groups.setdefault(key, [])
+            if sign > 0:
+                insort(group, score)
+            else:
+                remove_sorted(group, score)
+                if not group:
+                    del groups[key]
+
+    def remove(self, player_id, time, action, score):
+        self.add(player_id, time, action, score, -1)
+
+    def summary(self):
+        count = len(self.scores)
+        return {
+            "count": count,
+            "mean": {key: round(total / count, 1) if count else 0 for key, total in self.totals.items()},
+            "percentiles": {name: percentile(self.scores, fraction)
+                            for name, fraction in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99))},
+            "best": self.scores[-1] if self.scores else 0,
+            "histogram": [{"start": bucket * self.bucket_size, "count": self.histogram[bucket]}
+                          for bucket in sorted(self.histogram)],
+            "grades": [self.group_summary(key, scores) for key, scores in sorted(self.grades.items())],
+            "classes": [self.group_summary(key, scores) for key, scores in sorted(self.classes.items())],
+        }
+
+    @staticmethod
+    def group_summary(key, scores):
+        return {"group": key, "count": len(scores), "mean": round(sum(scores) / len(scores), 1), "best": scores[-1]}
+
+
+class ScoreStats:
+    # aggregates built from the database once at startup and then updated by the write endpoints.
+    # summaries are cached per season until the next write touches that season.
+    def __init__(self, bucket_size=5000):
+        self.bucket_size = bucket_size
+        self.seasons = {}
+        self.playcounts = {}
+        self.playcount_distribution = {}
+        self.cache = {}
+
+    def load(self, scores, playcounts):
+        self.__init__(self.bucket_size)
+        for row in scores:
+            self.add_score(row.id, row.season, row.time, row.action, row.score)
+        for row in playcounts:
+            self.set_playcount(row.id, row.count)
+
+    def season(self, season):
+        if season not in self.seasons:
+            self.seasons[season] = SeasonStats(self.bucket_size)
+        return self.seasons[season]
+
+    def add_score(self, player_id, season, time, action, score):
+        self.season(season).add(player_id, time, action, score)
+        self.cache.pop(season, None)
+
+    def replace_score(self, player_id, previous, season, time, action, score):
+        # previous is the (season, time, action, score) the row held before it was overwritten
+        self.remove_score(player_id, *previous)
+        self.add_score(player_id, season, time, action, score)
+
+    def remove_score(self, player_id, season, time, action, score):
+        self.season(season).remove(player_id, time, action, score)
+        if not self.seasons[season].scores:
+            del self.seasons[season]
+        self.cache.pop(season, None)
+
+    def set_playcount(self, player_id, count):
+        previous = self.playcounts.get(player_id)
+        if previous is not None:
+            self.playcount_distribution[previous] -= 1
+            if not self.playcount_distribution[previous]:
+                del self.playcount_distribution[previous]
+        self.playcounts[player_id] = count
+        self.playcount_distribution[count] = self.playcount_distribution.get(count, 0) + 1
+        self.cache.clear()
+
+    def summary(self, season):
+        # only writes create a season, a season nobody played in gets an empty summary that is not cached
+        if season in self.cache:
+            return self.cache[season]
+        season_stats = self.seasons.get(season)
+        summary = (season_stats or SeasonStats(self.bucket_size)).summary()
+        summary["season"] = season
+        summary["playcounts"] = [{"count": count, "players": players}
+                                 for count, players in sorted(self.playcount_distribution.items())]
+        if season_stats is not None:
+            self.cache[season] = summary
+        return summary
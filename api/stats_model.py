@@ -0,0 +1,46 @@
+from pydantic import BaseModel, Field
+from typing import Dict, List
+
+
+class HistogramBucketModel(BaseModel):
+    start: int = Field(..., description="구간 시작 점수")
+    count: int = Field(..., description="구간에 속한 학생 수")
+
+
+class PlayCountBucketModel(BaseModel):
+    count: int = Field(..., description="플레이 횟수")
+    players: int = Field(..., description="해당 횟수만큼 플레이한 학생 수")
+
+
+class GroupStatsModel(BaseModel):
+    group: str = Field(..., description="학년 또는 학년-반")
+    count: int = Field(..., description="점수를 기록한 학생 수")
+    mean: float = Field(..., description="평균 점수")
+    best: int = Field(..., description="최고 점수")
+
+
+class StatsResponseModel(BaseModel):
+    season: int = Field(..., description="회차")
+    count: int = Field(..., description="점수를 기록한 학생 수")
+    mean: Dict[str, float] = Field(..., description="시간, 액션, 전체 점수의 평균")
+    percentiles: Dict[str, int] = Field(..., description="전체 점수의 백분위수")
+    best: int = Field(..., description="최고 점수")
+    histogram: List[HistogramBucketModel] = Field(..., description="전체 점수 분포")
+    grades: List[GroupStatsModel] = Field(..., description="학년별 통계")
+    classes: List[GroupStatsModel] = Field(..., description="반별 통계")
+    playcounts: List[PlayCountBucketModel] = Field(..., description="플레이 횟수 분포")
+
+    class Config:
+        schema_extra = {
+            "example": {
+                "season": 1,
+                "count": 3,
+                "mean": {"time": 20000, "action": 2000, "score": 22000},
+                "percentiles": {"p50": 22000, "p90": 25000, "p99": 25000},
+                "best": 25000,
+                "histogram": [{"start": 20000, "count": 3}],
+                "grades": [{"group": "1", "count": 3, "mean": 22000, "best": 25000}],
+                "classes": [{"group": "1-1", "count": 3, "mean": 22000, "best": 25000}],
+                "playcounts": [{"count": 1, "players": 2}, {"count": 2, "players": 1}]
+            }
+        }
@@ -0,0 +1,108 @@
+import os
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+from argparse import ArgumentParser
+from statistics import median
+from time import perf_counter
+from pathlib import Path
+from tempfile import TemporaryDirectory
+import json
+import platform
+import sys
+
+import pygame as pg
+
+BENCHDIR = Path(__file__).parent.absolute()
+sys.path.insert(0, str(BENCHDIR.parent))
+
+from bench.cases import CASES, BenchGame
+from lib.telemetry import telemetry
+
+
+def measure(run, repeat, warmup, min_time):
+    # every sample is the mean of as many calls as fit in min_time
+    for _ in range(warmup):
+        run()
+    loops = 1
+    while True:
+        start = perf_counter()
+        for _ in range(loops):
+            run()
+        if perf_counter() - start >= min_time or loops >= 1 << 20:
+            break
+        loops *= 2
+    samples = []
+    for _ in range(repeat):
+        start = perf_counter()
+        for _ in range(loops):
+            run()
+        samples.append((perf_counter() - start) / loops)
+    return {"median_us": median(samples) * 1e6, "min_us": min(samples) * 1e6, "loops": loops, "repeat": repeat}
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        ratio = result["median_us"] / baseline[name]["median_us"]
+        result["baseline_median_us"] = baseline[name]["median_us"]
+        result["ratio"] = ratio
+        if ratio > 1 + tolerance:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = ArgumentParser(prog="python -m bench", description="DodgeGame hot path benchmarks")
+    parser.add_argument("-k", "--filter", default="", help="only run cases whose name contains this")
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--min-time", type=float, default=0.05, help="seconds per sample")
+    parser.add_argument("--output", default=str(BENCHDIR / "results.json"))
+    parser.add_argument("--baseline", default=str(BENCHDIR / "baseline.json"))
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed slowdown against the baseline")
+    args = parser.parse_args()
+
+    # the scenes emit telemetry as they would in a game, a bench run must not land in the kiosk's records
+    telemetry_dir = TemporaryDirectory()
+    telemetry.configure(telemetry_dir.name)
+    pg.display.init()
+    pg.font.init()
+    game = BenchGame(pg.display.set_mode((800, 800)))
+
+    results = {}
+    for name, factory in CASES.items():
+        if args.filter not in name:
+            continue
+        results[name] = measure(factory(game), args.repeat, args.warmup, args.min_time)
+
+    regressions = []
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare(results, json.load(f)["results"], args.tolerance)
+
+    for name, result in results.items():
+        line = f"{name:45} {result['median_us']:12.2f} us"
+        if "ratio" in result:
+            line += f"  x{result['ratio']:.2f}{'  REGRESSION' if name in regressions else ''}"
+        print(line)
+
+    report = {
+        "meta": {"python": platform.python_version(), "pygame": pg.version.ver, "platform": platform.platform()},
+        "results": results,
+        "regressions": regressions
+    }
+    with open(args.baseline if args.save_baseline else args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    pg.quit()
+    telemetry.flush()
+    telemetry_dir.cleanup()
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
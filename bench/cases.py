@@ -0,0 +1,212 @@
+from random import Random
+from functools import partial
+
+import pygame as pg
+
+from lib.object import Text, Color, Colors, TextShadowEffect, Enemy, Star
+from lib.scene import font_located
+from lib.simulation import DodgeSimulation
+from lib.replay import KeyState
+from lib.event import EventWrapper
+from lib.difficulty import available_profiles, load_difficulty
+from lib.pattern import load_formations
+from lib import scene
+
+CASES = {}
+
+
+def case(name, **params):
+    def register(function):
+        CASES[name] = partial(function, **params) if params else function
+        return function
+    return register
+
+
+class BenchGame:
+    # the parts of Game that the scenes touch, without the main loop
+    def __init__(self, screen):
+        self.screen = screen
+        self.time = 0
+        self.offline = True
+        self.api_authkey = ""
+        self.api_url = "http://127.0.0.1:9"
+        self.session = "bench"
+        self.playable_count = 3
+        self.playable = 3
+        self.student_id = "10101"
+        self.student_grade = 1
+        self.student_class = 1
+        self.student_number = 1
+        self.difficulty = "default"
+        self.scene = None
+
+    def change_scene(self, sceneObjClass, datas={}):
+        pass
+
+    def preload_scene(self, sceneObjClass):
+        pass
+
+    def quit(self):
+        pass
+
+
+def inherited_data():
+    return {"inheritGroups": {"stars": pg.sprite.Group(), "title": pg.sprite.Group(), "buttons": pg.sprite.Group(),
+                              "enemy": pg.sprite.Group()},
+            "lastStarCreation": pg.time.get_ticks()}
+
+
+def synthetic_enemies(game, count, seed=0):
+    # enemies spread over the screen, kept still so that the player never gets hit
+    rng = Random(seed)
+    width, height = game.screen.get_size()
+    enemies = []
+    for _ in range(count):
+        enemy = Enemy(rng.randint(-5, 5), rng.randint(-5, 5), (width // 2, height // 2), True, False,
+                      game.screen.get_size(), clock=lambda: game.time, rng=rng)
+        enemy.x_change = 0
+        enemy.y_change = 0
+        while True:
+            enemy.rect.center = (rng.randint(0, width), rng.randint(0, height))
+            if abs(enemy.rect.centerx - width // 2) > 60 or abs(enemy.rect.centery - height // 2) > 60:
+                break
+        enemy.previous_pos = enemy.rect.topleft
+        enemies.append(enemy)
+    return enemies
+
+
+@case("game_update.50", enemies=50)
+@case("game_update.200", enemies=200)
+@case("game_update.1000", enemies=1000)
+def game_update(game, enemies):
+    game_scene = scene.GameScene(game, inherited_data())
+    # no new enemies, the field stays at the requested size and the run never ends
+    game_scene.simulation.summon_delay = lambda elapsed_time: float("inf")
+    game_scene.simulation.enemies.add(synthetic_enemies(game, enemies))
+
+    def run():
+        game.time += 17
+        game_scene.update(None)
+    return run
+
+
+@case("collision.200", enemies=200)
+def collision(game, enemies):
+    game_scene = scene.GameScene(game, inherited_data())
+    simulation = game_scene.simulation
+    items = synthetic_enemies(game, enemies)
+
+    def run():
+        for item in items:
+            if not simulation.normal_hit(item):
+                simulation.point_hit(item)
+    return run
+
+
+@case("text_construct")
+def text_construct(game):
+    font = pg.font.Font(font_located('BlackHanSans-Regular'), 40)
+
+    def run():
+        Text("부평고 2022 코딩동아리 게임", font, Colors.ORANGE, (400, 100),
+             TextShadowEffect(Colors.ORANGE + Color(20, 20, 20), (2, 2)))
+    return run
+
+
+@case("text_render")
+def text_render(game):
+    font = pg.font.Font(font_located('BlackHanSans-Regular'), 40)
+    text = Text("부평고 2022 코딩동아리 게임", font, Colors.ORANGE, (400, 100),
+                TextShadowEffect(Colors.ORANGE + Color(20, 20, 20), (2, 2)))
+
+    def run():
+        text.render(game.screen)
+    return run
+
+
+@case("enemy_construct")
+def enemy_construct(game):
+    rng = Random(0)
+
+    def run():
+        Enemy(rng.randint(-5, 5), rng.randint(-5, 5), (400, 400), rng.randint(0, 1) == 1, rng.randint(0, 1) == 1,
+              game.screen.get_size(), clock=lambda: game.time, rng=rng)
+    return run
+
+
+@case("star_update.100", stars=100)
+def star_update(game, stars):
+    rng = Random(0)
+    group = pg.sprite.Group([Star(rng.randint(0, 800), rng.randint(0, 800)) for _ in range(stars)])
+    for star in group:
+        star.live_time = 10 ** 9
+
+    def run():
+        group.update(None)
+    return run
+
+
+@case("ui_idle_frame")
+def ui_idle_frame(game):
+    # a frame of the id input screen with the mouse away and no input, what the kiosk spends its time on
+    id_scene = scene.StudentIDInputScene(game, {})
+    events = EventWrapper([])
+
+    def run():
+        id_scene.update(events)
+        id_scene.render(game.screen)
+    return run
+
+
+def formation_spawn(name):
+    def factory(game):
+        formation = load_formations()[name]
+        rng = Random(0)
+        bounds = pg.Rect(-20, -20, 840, 840)
+
+        def run():
+            formation.spawn((400, 400), game.screen.get_size(), rng, bounds, lambda: game.time)
+        return run
+    return factory
+
+
+def simulation_run(profile):
+    # one deterministic run per call: fixed seed, player standing still, 60 fps, capped at two minutes
+    def factory(game):
+        schedule = load_difficulty(profile)
+        keys = KeyState(0)
+
+        def run():
+            now = [0]
+            simulation = DodgeSimulation(game.screen.get_size(), 0, clock=lambda: now[0], record=False,
+                                         difficulty=schedule)
+            while not simulation.finished and now[0] < 120000:
+                now[0] += 16
+                simulation.step(keys)
+        return run
+    return factory
+
+
+def scene_construct(scene_class, data_factory):
+    def factory(game):
+        def run():
+            scene_class(game, data_factory())
+        return run
+    return factory
+
+
+for scene_class, data_factory in (
+        (scene.StudentIDInputScene, dict),
+        (scene.IDMenuTransition, dict),
+        (scene.MenuScene, dict),
+        (scene.MenuGameTransition, inherited_data),
+        (scene.GameScene, inherited_data),
+        (scene.ResultScene, lambda: dict(inherited_data(), elapsedTime=10000, score=2000, totalScore=12000)),
+        (scene.HowToPlayScene, dict)):
+    CASES[f"scene_construct.{scene_class.__name__}"] = scene_construct(scene_class, data_factory)
+
+for profile in available_profiles():
+    CASES[f"simulation.{profile}"] = simulation_run(profile)
+
+for name in load_formations():
+    CASES[f"formation_spawn.{name}"] = formation_spawn(name)
@@ -1,27 +1,55 @@
+from time import perf_counter
+# taken before pygame is imported, the startup report measures from here to the first frame
+STARTUP_MARKS = [("start", perf_counter())]
+
 import pygame as pg
 from secrets import token_hex
+from threading import Thread
 
-from os import path
+from os import path, environ
 
-from lib.scene import StudentIDInputScene
+STARTUP_MARKS.append(("import pygame", perf_counter()))
 
-class EventWrapper:
-    def __init__(self, events):
-        self.events = events
-    
-    def __contains__(self, item):
-        return item in self['type']
+from lib.scene import StudentIDInputScene, http
+from lib.event import EventDispatcher
+from lib.profiler import profiler
+from lib.telemetry import telemetry
+from lib.display import display
+from lib.difficulty import check_profile
 
-    def __getitem__(self, key):
-        return [event.__getattribute__(key) for event in self.events]
+STARTUP_MARKS.append(("import lib", perf_counter()))
+
+# gameplay and animations run clock-locked at GAME_FPS. Clock.tick waits whole milliseconds, so frames do not land on
+# the player's 80 and the enemies' 60 updates per second, the sprites carry the remainder to keep those rates.
+# static screens run at STATIC_FPS while in use and block on input at IDLE_FPS once nothing happened for IDLE_AFTER ms
+GAME_FPS = 240
+STATIC_FPS = 60
+IDLE_FPS = 15
+IDLE_AFTER = 2000
 
 class Game:
     def __init__(self):
-        pg.init()
+        # only what the game uses, pg.init() would also bring up audio, joysticks and the rest
+        pg.display.init()
+        pg.font.init()
+        STARTUP_MARKS.append(("init display, font", perf_counter()))
+        # without pg.init() the timer only starts with the first Clock, get_ticks() is 0 until then
+        self.clock = pg.time.Clock()
         self.time = pg.time.get_ticks()
-        self.screen = pg.display.set_mode((800, 800))
+        # DODGE_WINDOW=fullscreen|<width>x<height> scales the 800x800 layout to the window,
+        # DODGE_SCALE_FILTER=smooth|nearest picks the filter
+        window = environ.get("DODGE_WINDOW", "")
+        self.screen = display.open(tuple(int(n) for n in window.split("x")) if "x" in window else None,
+                                   fullscreen=window == "fullscreen",
+                                   scale_filter=environ.get("DODGE_SCALE_FILTER", "smooth"))
         pg.display.set_caption("DodgeGame")
-        self.clock = pg.time.Clock()
+        STARTUP_MARKS.append(("open window", perf_counter()))
+        self.last_input_time = self.time
+        self.dispatcher = EventDispatcher(display.map_event)
+        # scenes marked cacheable are built once and resumed afterwards
+        self.scene_cache = {}
+        self.preloads = {}
+        self.dispatcher.subscribe(pg.KEYDOWN, self.on_key_down)
         self.finished = False
         self.offline = True
         self.session = str(token_hex(20))
@@ -32,31 +60,140 @@ class Game:
         else:
             self.api_authkey = ""
         
+        # difficulty profile from assets/difficulty, a bad one stops the kiosk here instead of when a game starts
+        self.difficulty = environ.get("DODGE_DIFFICULTY", "default")
+        check_profile(self.difficulty)
+        # DODGE_PLAYERS=<1-4> local players sharing the keyboard, see lib/simulation.py KEY_BINDINGS
+        self.players = int(environ.get("DODGE_PLAYERS", 1))
+        
         self.student_grade = None
         self.student_class = None
         self.student_number = None
         
+        # DODGE_PROFILE=<file.csv|file.json> records frame timings and dumps them on exit, F3 toggles the overlay
+        if environ.get("DODGE_PROFILE"):
+            profiler.enable(environ["DODGE_PROFILE"])
+        
+        # session records go to telemetry/ (DODGE_TELEMETRY_DIR overrides), `python -m lib.telemetry` summarizes them
+        if environ.get("DODGE_TELEMETRY_DIR"):
+            telemetry.configure(environ["DODGE_TELEMETRY_DIR"])
+        telemetry.set_context(session=self.session)
+        
+        # DODGE_IDLE_TIMEOUT=<seconds> without input on a signed-in screen goes back to the id input, 0 disables it
+        self.idle_timeout = int(environ.get("DODGE_IDLE_TIMEOUT", 120)) * 1000
+        
+        # DODGE_PROFILE_STARTUP=1 prints where the time to the first frame went, it is always sent to telemetry
+        self.profile_startup = environ.get("DODGE_PROFILE_STARTUP") == "1"
+
         self.change_scene(StudentIDInputScene)
+        STARTUP_MARKS.append(("first scene", perf_counter()))
 
         self.playable_count = 3
 
     def start(self):
+        pending = ()
+        first_frame = True
         while not self.finished:
+            profiler.begin_frame()
             self.time = pg.time.get_ticks()
-            events = EventWrapper(pg.event.get())
+            with profiler.section("events"):
+                events = self.dispatcher.poll(pending)
             
             if pg.QUIT in events:
                 break
+            if events.events:
+                self.last_input_time = self.time
             
             self.screen.fill(self.scene.screen_color)
             self.scene.update(events)
             self.scene.render(self.screen)
+            with profiler.section("warm"):
+                self.warm_preloads()
+            self.check_idle()
+            # the overlay shows the frames before this one, which ends after the flip so that its time is recorded
+            profiler.render_overlay(self.screen)
             
-            pg.display.flip()
+            with profiler.section("flip"):
+                display.present()
+            profiler.end_frame()
+            if first_frame:
+                first_frame = False
+                self.on_first_frame()
+            pending = self.pace()
+        profiler.dump()
+        telemetry.flush()
         pg.quit()
     
+    def on_first_frame(self):
+        STARTUP_MARKS.append(("first frame", perf_counter()))
+        steps = {name: round((at - previous) * 1000, 1)
+                 for (_, previous), (name, at) in zip(STARTUP_MARKS, STARTUP_MARKS[1:])}
+        total = round((STARTUP_MARKS[-1][1] - STARTUP_MARKS[0][1]) * 1000, 1)
+        telemetry.emit("startup", total_ms=total, steps=steps)
+        if self.profile_startup:
+            for name, duration in steps.items():
+                print(f"{name:20} {duration:8.1f} ms")
+            print(f"{'total':20} {total:8.1f} ms")
+        # the network stack is imported while the student types the id, before the first server check needs it
+        Thread(target=http, daemon=True).start()
+
+    def pace(self):
+        # returns the event that ended an idle wait, it belongs to the next frame
+        if self.scene.frame_mode != "static":
+            self.clock.tick(GAME_FPS)
+            return ()
+        if self.time - self.last_input_time < IDLE_AFTER or self.scene.dirty_rects():
+            self.clock.tick(STATIC_FPS)
+            return ()
+        event = pg.event.wait(1000 // IDLE_FPS)
+        self.clock.tick()
+        return () if event.type == pg.NOEVENT else (event,)
+    
+    def check_idle(self):
+        # a student who walked away is signed out so the next one starts from the id input
+        if self.idle_timeout and self.scene.attract_on_idle and self.scene.frame_mode == "static" \
+                and self.time - self.last_input_time > self.idle_timeout:
+            telemetry.emit("idle_logout", scene=type(self.scene).__name__)
+            self.last_input_time = self.time
+            self.change_scene(StudentIDInputScene)
+    
+    def on_key_down(self, event):
+        if event.key == pg.K_F3:
+            profiler.toggle_overlay()
+    
+    def preload_scene(self, sceneObjClass):
+        # prepares a scene's files on a worker thread, change_scene hands them over as datas["preloaded"].
+        # a preload still waiting for its scene is kept, a second one would leave the first one's ghost file open
+        if sceneObjClass in self.preloads:
+            return
+        preloaded = {}
+        thread = Thread(target=lambda: preloaded.update(sceneObjClass.preload(self)), daemon=True)
+        thread.start()
+        self.preloads[sceneObjClass] = (thread, preloaded, False)
+    
+    def warm_preloads(self):
+        # the font and surface half of a finished preload runs on the main thread in a frame of the current scene,
+        # one scene per frame, so that the first frame of the preloaded scene does not pay for it
+        for sceneObjClass, (thread, preloaded, warmed) in self.preloads.items():
+            if not warmed and not thread.is_alive():
+                sceneObjClass.warm(self, preloaded)
+                self.preloads[sceneObjClass] = (thread, preloaded, True)
+                return
+    
     def change_scene(self, sceneObjClass, datas={}):
+        if sceneObjClass in self.preloads:
+            thread, preloaded, warmed = self.preloads.pop(sceneObjClass)
+            thread.join()
+            if not warmed:
+                sceneObjClass.warm(self, preloaded)
+            datas = dict(datas, preloaded=preloaded)
+        if sceneObjClass in self.scene_cache:
+            self.scene = self.scene_cache[sceneObjClass]
+            self.scene.resume(datas)
+            return
         self.scene = sceneObjClass(self, datas)
+        if getattr(sceneObjClass, "cacheable", False):
+            self.scene_cache[sceneObjClass] = self.scene
     
     def quit(self):
         self.finished = True
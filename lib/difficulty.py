@@ -0,0 +1,109 @@
+from array import array
+from functools import lru_cache
+from pathlib import Path
+from os import path, listdir
+import json
+
+from lib.replay import difficulty_name_bytes
+
+BASEDIR = Path(__file__).parent.parent.absolute()
+PROFILE_DIR = path.join(BASEDIR, 'assets', 'difficulty')
+
+CURVE_NAMES = ("spawn_delay", "speed", "aim_spread")
+
+
+def profile_located(name):
+    return path.join(PROFILE_DIR, name + '.json')
+
+
+def available_profiles():
+    return sorted(path.splitext(filename)[0] for filename in listdir(PROFILE_DIR)
+                  if filename.endswith('.json'))
+
+
+def check_profile(name):
+    # cheap enough for startup: the profile exists and its name fits a replay header
+    if name not in available_profiles():
+        raise ValueError(f"Unknown difficulty profile '{name}', available: {', '.join(available_profiles())}")
+    difficulty_name_bytes(name)
+
+
+class Curve:
+    # a curve sampled once into a table every `resolution` ms,
+    # after the last sample the curve stays at its final value
+    def __init__(self, spec, resolution):
+        self.resolution = resolution
+        if "polynomial" in spec:
+            coefficients = spec["polynomial"]
+            low = spec.get("min", float("-inf"))
+            high = spec.get("max", float("inf"))
+            function = lambda x: min(max(sum(c * (x ** i) for i, c in enumerate(coefficients)), low), high)
+            horizon = spec.get("until", self.polynomial_horizon(function, low, high))
+        elif "keyframes" in spec:
+            keyframes = sorted(spec["keyframes"])
+            step = spec.get("interpolation", "linear") == "step"
+            function = lambda x: self.interpolate(keyframes, x, step)
+            horizon = keyframes[-1][0]
+        else:
+            raise ValueError(f"Unknown curve: {spec}")
+        self.table = array('d', (function(index * resolution) for index in range(int(horizon // resolution) + 2)))
+        self.last = len(self.table) - 1
+
+    @staticmethod
+    def polynomial_horizon(function, low, high, limit=10 * 60 * 1000):
+        # first time the clamped polynomial gets stuck at one of its limits
+        for x in range(0, limit, 10):
+            if function(x) in (low, high):
+                return x
+        return limit
+
+    @staticmethod
+    def interpolate(keyframes, x, step):
+        if x <= keyframes[0][0]:
+            return keyframes[0][1]
+        for (x0, y0), (x1, y1) in zip(keyframes, keyframes[1:]):
+            if x < x1:
+                if step:
+                    return y0
+                return y0 + (y1 - y0) * (x - x0) / (x1 - x0)
+        return keyframes[-1][1]
+
+    def __call__(self, elapsed_time):
+        index = int(elapsed_time // self.resolution)
+        return self.table[index if index < self.last else self.last]
+
+
+class DifficultySchedule:
+    def __init__(self, name="default"):
+        check_profile(name)
+        with open(profile_located(name), "r", encoding="utf-8") as f:
+            profile = json.load(f)
+        self.name = name
+        self.description = profile.get("description", "")
+        resolution = profile.get("resolution", 1)
+        curves = profile["curves"]
+        for curve_name in CURVE_NAMES:
+            if curve_name not in curves:
+                raise ValueError(f"Difficulty profile '{name}' has no '{curve_name}' curve")
+        self.spawn_delay = Curve(curves["spawn_delay"], resolution)
+        self.speed = Curve(curves["speed"], resolution)
+        self.aim_spread = Curve(curves["aim_spread"], resolution)
+        self.waves = self.wave_timeline(profile.get("waves", []))
+
+    @staticmethod
+    def wave_timeline(waves, horizon=10 * 60 * 1000):
+        # every formation wave expanded to a sorted list of (time, formation name)
+        timeline = []
+        for wave in waves:
+            if "at" in wave:
+                timeline.append((wave["at"], wave["formation"]))
+            else:
+                until = wave.get("until", horizon)
+                timeline.extend((time, wave["formation"]) for time in range(wave["from"], until + 1, wave["every"]))
+        return sorted(timeline)
+
+
+@lru_cache(maxsize=None)
+def load_difficulty(name="default"):
+    # schedules are read-only once built, so every game with the same profile shares one
+    return DifficultySchedule(name)
@@ -0,0 +1,68 @@
+import pygame as pg
+
+SCALE_FILTERS = {"smooth": pg.transform.smoothscale, "nearest": pg.transform.scale}
+
+
+class DisplayTarget:
+    # the scenes always draw into `surface` at the logical size their layout is written for.
+    # when the window has another size the frame is scaled once per present() into a letterboxed area,
+    # and mouse positions are mapped back to logical pixels.
+    def __init__(self, logical_size=(800, 800)):
+        self.logical_size = tuple(logical_size)
+        self.window = None
+        self.surface = None
+        self.scaled = None
+        self.dest = None
+        self.factor = 1
+        self.scale = SCALE_FILTERS["smooth"]
+
+    def open(self, window_size=None, fullscreen=False, scale_filter="smooth"):
+        if scale_filter not in SCALE_FILTERS:
+            raise ValueError(f"Unknown scale filter '{scale_filter}'")
+        if fullscreen:
+            self.window = pg.display.set_mode(window_size or (0, 0), pg.FULLSCREEN)
+        else:
+            self.window = pg.display.set_mode(window_size or self.logical_size)
+        if self.window.get_size() == self.logical_size:
+            # drawn straight into the window, present() is a plain flip
+            self.surface = self.window
+            self.scaled = None
+            self.factor = 1
+            return self.surface
+
+        width, height = self.window.get_size()
+        self.factor = min(width / self.logical_size[0], height / self.logical_size[1])
+        self.dest = pg.Rect(0, 0, round(self.logical_size[0] * self.factor), round(self.logical_size[1] * self.factor))
+        self.dest.center = (width // 2, height // 2)
+        self.surface = pg.Surface(self.logical_size, 0, self.window)
+        self.scaled = pg.Surface(self.dest.size, 0, self.window)
+        self.scale = SCALE_FILTERS[scale_filter]
+        # the letterbox bars are filled once, present() only ever touches the scaled area
+        self.window.fill((0, 0, 0))
+        return self.surface
+
+    def present(self):
+        if self.scaled is not None:
+            # scaled into a surface kept between frames, so no frame allocates a new one
+            self.scale(self.surface, self.dest.size, self.scaled)
+            self.window.blit(self.scaled, self.dest)
+        pg.display.flip()
+
+    def to_logical(self, position):
+        if self.scaled is None:
+            return position
+        return (int((position[0] - self.dest.x) / self.factor), int((position[1] - self.dest.y) / self.factor))
+
+    def mouse_pos(self):
+        return self.to_logical(pg.mouse.get_pos())
+
+    def map_event(self, event):
+        if self.scaled is None or not hasattr(event, "pos"):
+            return event
+        attributes = dict(event.dict, pos=self.to_logical(event.pos))
+        if hasattr(event, "rel"):
+            attributes["rel"] = (int(event.rel[0] / self.factor), int(event.rel[1] / self.factor))
+        return pg.event.Event(event.type, attributes)
+
+
+display = DisplayTarget()
@@ -0,0 +1,72 @@
+import pygame as pg
+
+
+class EventWrapper:
+    # one frame of events, indexed by type once so that `pg.KEYDOWN in events` is a dict lookup
+    def __init__(self, events):
+        self.events = events
+        self.by_type = {}
+        for event in events:
+            if event.type in self.by_type:
+                self.by_type[event.type].append(event)
+            else:
+                self.by_type[event.type] = [event]
+
+    def __contains__(self, item):
+        return item in self.by_type
+
+    def __getitem__(self, key):
+        return [event.__getattribute__(key) for event in self.events]
+
+    def __iter__(self):
+        return iter(self.events)
+
+    def of_type(self, event_type):
+        return self.by_type.get(event_type, ())
+
+    def key_down(self, key=None):
+        if key is None:
+            return self.of_type(pg.KEYDOWN)
+        return [event for event in self.of_type(pg.KEYDOWN) if event.key == key]
+
+    def mouse_button_down(self, button=None):
+        if button is None:
+            return self.of_type(pg.MOUSEBUTTONDOWN)
+        return [event for event in self.of_type(pg.MOUSEBUTTONDOWN) if event.button == button]
+
+    def mouse_button_up(self, button=None):
+        if button is None:
+            return self.of_type(pg.MOUSEBUTTONUP)
+        return [event for event in self.of_type(pg.MOUSEBUTTONUP) if event.button == button]
+
+    def mouse_motion(self):
+        return self.of_type(pg.MOUSEMOTION)
+
+
+class EventDispatcher:
+    # polls pygame once per frame and calls the handlers subscribed to the event types that arrived
+    def __init__(self, event_map=None):
+        # event_map: applied to every event first, e.g. mapping mouse positions to logical pixels
+        self.handlers = {}
+        self.event_map = event_map
+
+    def subscribe(self, event_type, handler):
+        self.handlers.setdefault(event_type, []).append(handler)
+        return handler
+
+    def unsubscribe(self, event_type, handler):
+        if handler in self.handlers.get(event_type, ()):
+            self.handlers[event_type].remove(handler)
+
+    def poll(self, pending=()):
+        # pending: events already taken off the queue, e.g. the one that woke an idle wait
+        events = [*pending, *pg.event.get()]
+        if self.event_map:
+            events = [self.event_map(event) for event in events]
+        events = EventWrapper(events)
+        for event_type, handlers in self.handlers.items():
+            if handlers and event_type in events:
+                for event in events.of_type(event_type):
+                    for handler in tuple(handlers):
+                        handler(event)
+        return events
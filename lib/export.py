@@ -0,0 +1,192 @@
+from argparse import ArgumentParser
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from os import path, makedirs, cpu_count, environ
+from queue import Queue
+from subprocess import Popen, PIPE, DEVNULL
+from threading import Thread
+from time import perf_counter
+from struct import pack
+import shutil
+import zlib
+
+import pygame as pg
+
+from lib.object import Colors
+from lib.replay import FLAG_SWEPT_COLLISION, read_header, iter_frames
+from lib.scene import Scene, load_font
+from lib.simulation import DodgeSimulation
+
+
+class ReplayScene(Scene):
+    # GameScene's field and score drawn from a recorded run, the replay's keys and frame times drive the simulation
+    def __init__(self, header):
+        super().__init__()
+        self.screen_color = Colors.BLACK.as_iter()
+        self.now = 0
+        self.simulation = DodgeSimulation(header["screen_size"], header["seed"], clock=lambda: self.now, record=False,
+                                          swept_collision=bool(header["flags"] & FLAG_SWEPT_COLLISION),
+                                          difficulty=header["difficulty"])
+        self.groups["player"] = self.simulation.players
+        self.groups["enemy"] = self.simulation.enemies
+
+        self.score_display_font = load_font('INVASION2000', 60)
+        self.shown_time = None
+        self.add_raw_item(None, (header["screen_size"][0] / 2, header["screen_size"][1] / 8), "score_displayer")
+
+    def step(self, frame_time, keys):
+        self.now = frame_time
+        self.simulation.step(keys)
+
+    def render(self, screen):
+        if self.simulation.elapsed_time != self.shown_time:
+            self.shown_time = self.simulation.elapsed_time
+            self.raws["score_displayer"][0] = self.score_display_font.render(str(self.shown_time), True,
+                                                                             Colors.ORANGE.as_iter())
+        super().render(screen)
+
+
+def read_replay(file_path):
+    # a plain replay blob, or a ghost file whose first line is the score
+    with open(file_path, "r", encoding="ascii") as f:
+        lines = f.read().split()
+    if len(lines) > 1 and lines[0].isdigit():
+        lines = lines[1:]
+    return "".join(lines)
+
+
+def render_frames(blob, fps, hold=1000):
+    # yields the raw RGB bytes of every output frame, a frame shows every input recorded up to its time.
+    # the last frame is repeated for `hold` ms so the clip does not end on the hit itself
+    header = read_header(blob)
+    scene = ReplayScene(header)
+    surface = pg.Surface(header["screen_size"])
+    frame_ms = 1000 / fps
+
+    def draw():
+        surface.fill(scene.screen_color)
+        scene.render(surface)
+        return pg.image.tobytes(surface, "RGB")
+
+    next_frame = 0
+    for frame_time, keys in iter_frames(blob):
+        while next_frame < frame_time:
+            yield draw()
+            next_frame += frame_ms
+        scene.step(frame_time, keys)
+        if scene.simulation.finished:
+            break
+    last = draw()
+    for _ in range(max(1, round(hold / frame_ms))):
+        yield last
+
+
+def png_chunk(kind, payload):
+    return pack(">I", len(payload)) + kind + payload + pack(">I", zlib.crc32(kind + payload))
+
+
+def save_png(data, size, file_path, level=1):
+    # written directly instead of pg.image.save: the frames are mostly black, so unfiltered rows
+    # at a low zlib level stay small and encode several times faster
+    stride = size[0] * 3
+    rows = b"".join(b"\0" + data[start:start + stride] for start in range(0, len(data), stride))
+    with open(file_path, "wb") as f:
+        f.write(b"\x89PNG\r\n\x1a\n" + png_chunk(b"IHDR", pack(">IIBBBBB", size[0], size[1], 8, 2, 0, 0, 0))
+                + png_chunk(b"IDAT", zlib.compress(rows, level)) + png_chunk(b"IEND", b""))
+
+
+class PngSequence:
+    # frames are compressed on worker processes while the next ones are simulated,
+    # at most `backlog` frames per worker wait in memory
+    def __init__(self, directory, size, workers, backlog=4):
+        makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.size = size
+        self.executor = ProcessPoolExecutor(max_workers=workers)
+        self.pending = deque()
+        self.limit = workers * backlog
+
+    def write(self, index, data):
+        if len(self.pending) >= self.limit:
+            self.pending.popleft().result()
+        self.pending.append(self.executor.submit(save_png, data, self.size,
+                                                 path.join(self.directory, f"frame{index:06d}.png")))
+
+    def close(self):
+        while self.pending:
+            self.pending.popleft().result()
+        self.executor.shutdown()
+
+
+class FfmpegVideo:
+    # raw frames piped into ffmpeg, which encodes on its own threads.
+    # a writer thread keeps the pipe busy so the simulation never waits on a full pipe
+    def __init__(self, file_path, size, fps, backlog=64):
+        ffmpeg = shutil.which("ffmpeg")
+        if ffmpeg is None:
+            raise RuntimeError("ffmpeg was not found on PATH, export a png sequence instead")
+        self.process = Popen([ffmpeg, "-y", "-loglevel", "error", "-f", "rawvideo", "-pix_fmt", "rgb24",
+                              "-s", f"{size[0]}x{size[1]}", "-r", str(fps), "-i", "-",
+                              "-pix_fmt", "yuv420p", file_path], stdin=PIPE, stdout=DEVNULL)
+        self.queue = Queue(backlog)
+        self.thread = Thread(target=self.pump, daemon=True)
+        self.thread.start()
+
+    def pump(self):
+        broken = False
+        while (data := self.queue.get()) is not None:
+            if broken:
+                continue
+            try:
+                self.process.stdin.write(data)
+            except BrokenPipeError:
+                # ffmpeg gave up, the queue is still drained and close() reports its exit status
+                broken = True
+        try:
+            self.process.stdin.close()
+        except BrokenPipeError:
+            pass
+
+    def write(self, index, data):
+        self.queue.put(data)
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+        if self.process.wait() != 0:
+            raise RuntimeError(f"ffmpeg exited with {self.process.returncode}")
+
+
+def export(blob, output, fps=60, workers=None, video=False):
+    size = read_header(blob)["screen_size"]
+    sink = FfmpegVideo(output, size, fps) if video else PngSequence(output, size, workers or cpu_count() or 1)
+    frames = 0
+    try:
+        for frames, data in enumerate(render_frames(blob, fps), 1):
+            sink.write(frames, data)
+    finally:
+        sink.close()
+    return frames
+
+
+def main():
+    parser = ArgumentParser(description="DodgeGame replay export")
+    parser.add_argument("replay", help="file holding a replay blob, or a ghost file from ghosts/")
+    parser.add_argument("output", help="directory for a png sequence, or a video file with --video")
+    parser.add_argument("--video", action="store_true", help="encode a video with ffmpeg instead of png frames")
+    parser.add_argument("--fps", type=int, default=60)
+    parser.add_argument("--workers", type=int, help="png encoding processes, all cores by default")
+    args = parser.parse_args()
+
+    # nothing is shown, the scenes only draw into offscreen surfaces
+    environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    pg.font.init()
+    start = perf_counter()
+    frames = export(read_replay(args.replay), args.output, args.fps, args.workers, args.video)
+    elapsed = perf_counter() - start
+    print(f"{frames} frames ({frames / args.fps:.1f} s of gameplay) in {elapsed:.1f} s, "
+          f"{frames / args.fps / elapsed:.1f}x real time -> {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+from pathlib import Path
+from os import path, makedirs, replace
+import zlib
+
+from lib.object import Player, Colors
+from lib.replay import KeyState, iter_file_frames
+
+BASEDIR = Path(__file__).parent.parent.absolute()
+GHOST_DIR = path.join(BASEDIR, 'ghosts')
+
+# alpha of the ghost player, the live player is drawn fully opaque on top of it
+GHOST_ALPHA = 90
+
+
+def ghost_located(difficulty):
+    return path.join(GHOST_DIR, difficulty + '.replay')
+
+
+def best_score(difficulty):
+    # a ghost file is the total score on the first line followed by the replay blob
+    try:
+        with open(ghost_located(difficulty), "r", encoding="ascii") as f:
+            return int(f.readline())
+    except (OSError, ValueError):
+        return None
+
+
+def save_ghost(difficulty, score, blob):
+    # keeps the best run of each difficulty on this machine, written aside and swapped in
+    # so that a ghost being read by a preload never sees a half written file
+    best = best_score(difficulty)
+    if best is not None and best >= score:
+        return False
+    makedirs(GHOST_DIR, exist_ok=True)
+    temporary = ghost_located(difficulty) + ".tmp"
+    with open(temporary, "w", encoding="ascii") as f:
+        f.write(f"{score}\n{blob}\n")
+    replace(temporary, ghost_located(difficulty))
+    return True
+
+
+class Ghost:
+    # the local best run replayed as a see-through player next to the live one.
+    # only its keys are replayed, its path does not depend on the enemies, and frames are
+    # decoded from the file as the game reaches them so a long run never sits in memory.
+    # opening and decoding may run on a preload worker, spawn() makes the player on the main thread
+    image = None
+
+    def __init__(self, difficulty):
+        self.file = open(ghost_located(difficulty), "r", encoding="ascii")
+        try:
+            self.score = int(self.file.readline())
+            self.frames = iter_file_frames(self.file)
+            # reads the header and the first chunk, so the first game frame does not wait for the disk
+            self.next_frame = next(self.frames, None)
+        except (ValueError, zlib.error):
+            self.file.close()
+            raise
+        self.now = 0
+        self.keys = KeyState(0)
+        self.player = None
+
+    def spawn(self, screen_size):
+        self.player = Player((screen_size[0] // 2, screen_size[1] // 2), Colors.BLUE,
+                             clock=lambda: self.now, controls=lambda: self.keys)
+        self.player.image = Ghost.translucent_image()
+        return self.player
+
+    @classmethod
+    def load(cls, difficulty):
+        if not path.exists(ghost_located(difficulty)):
+            return None
+        try:
+            return cls(difficulty)
+        except (OSError, ValueError, zlib.error):
+            return None
+
+    @classmethod
+    def translucent_image(cls):
+        if cls.image is None:
+            image = Player.load_assets()[0].copy()
+            image.set_colorkey(Colors.WHITE.as_color())
+            image.set_alpha(GHOST_ALPHA)
+            cls.image = image
+        return cls.image
+
+    def advance(self, elapsed_time):
+        # steps the ghost like DodgeSimulation.step steps its player, the frame it was hit on moves nothing
+        while self.next_frame is not None and self.next_frame[0] <= elapsed_time:
+            self.now, self.keys = self.next_frame
+            try:
+                self.next_frame = next(self.frames, None)
+            except (ValueError, zlib.error):
+                # a file damaged past its first chunk, the ghost just stops
+                self.next_frame = None
+            if self.next_frame is None:
+                self.close()
+                return
+            self.player.update(None)
+
+    def close(self):
+        self.next_frame = None
+        if self.player is not None:
+            self.player.kill()
+        self.frames.close()
+        self.file.close()
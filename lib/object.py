@@ -1,58 +1,108 @@
 from typing import Iterable
 from random import randint
+from io import BytesIO
+from pathlib import Path
+from os import path
 import pygame as pg
 
+from lib.profiler import profiler
+from lib.display import display
+
+BASEDIR = Path(__file__).parent.parent.absolute()
+# number keys on the main row and the keypad
+DIGIT_KEYS = {**{getattr(pg, f"K_{digit}"): str(digit) for digit in range(10)},
+              **{getattr(pg, f"K_KP{digit}"): str(digit) for digit in range(10)}}
+
+# a sprite that fell further behind than this many updates, e.g. after a stall, skips the rest
+MAX_CATCH_UP_STEPS = 5
+
+
+def _due_steps(sprite):
+    # fixed rate updates owed since the last one. frames end on whole milliseconds and rarely on an update,
+    # so the time past the last due update is carried over instead of lost, keeping the rate exact at any fps
+    interval = 1000 / sprite.update_per_second
+    now = sprite.clock()
+    steps = int((now - sprite.last_update_time) // interval)
+    if steps > MAX_CATCH_UP_STEPS:
+        sprite.last_update_time = now
+        return MAX_CATCH_UP_STEPS
+    sprite.last_update_time += steps * interval
+    return steps
+
+
+def _clamp(value):
+    return 255 if value > 255 else 0 if value < 0 else value
+
+
+def _offset(other):
+    # any accepted right-hand operand as an (r, g, b) tuple
+    if other.__class__ is Color:
+        return other.tuple
+    if other.__class__ is tuple:
+        return other
+    if other.__class__ is int:
+        return (other, other, other)
+    if other.__class__ is list:
+        return (other[0], other[1], other[2])
+    if other.__class__ is dict:
+        return (other['r'], other['g'], other['b'])
+    return None
+
+
 class Color:
-    def __init__(self, r, g, b):
-        if r > 255:
-            r = 255
-        elif r < 0:
-            r = 0
-        if g > 255:
-            g = 255
-        elif g < 0:
-            g = 0
-        if b > 255:
-            b = 255
-        elif b < 0:
-            b = 0
-        self.r = r
-        self.g = g
-        self.b = b
-    
+    # immutable and interned: equal components always give the same object, so the tuple and pg.Color
+    # forms are built once per colour and arithmetic results are cached on the left operand.
+    __slots__ = ("r", "g", "b", "tuple", "color", "sums", "differences")
+    interned = {}
+
+    def __new__(cls, r, g, b):
+        key = (_clamp(r), _clamp(g), _clamp(b))
+        color = cls.interned.get(key)
+        if color is None:
+            color = object.__new__(cls)
+            for name, value in zip(cls.__slots__, key + (key, pg.Color(*key), {}, {})):
+                object.__setattr__(color, name, value)
+            color = cls.interned.setdefault(key, color)
+        return color
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Color is immutable")
+
+    def __reduce__(self):
+        return Color, self.tuple
+
     def as_iter(self):
-        return (self.r, self.g, self.b)
+        return self.tuple
 
     def as_color(self):
-        return pg.Color(self.r, self.g, self.b)
+        # shared between every user of this colour, do not modify it
+        return self.color
 
     def reverse(self):
         return Color(255 - self.r, 255 - self.g, 255 - self.b)
 
     def __add__(self, other):
-        if isinstance(other, Color):
-            return Color(self.r + other.r, self.g + other.g, self.b + other.b)
-        elif isinstance(other, tuple):
-            return Color(self.r + other[0], self.g + other[1], self.b + other[2])
-        elif isinstance(other, int):
-            return Color(self.r + other, self.g + other, self.b + other)
-        elif isinstance(other, list):
-            return Color(self.r + other[0], self.g + other[1], self.b + other[2])
-        elif isinstance(other, dict):
-            return Color(self.r + other['r'], self.g + other['g'], self.b + other['b'])
-    
+        offset = _offset(other)
+        if offset is None:
+            return NotImplemented
+        result = self.sums.get(offset)
+        if result is None:
+            result = self.sums[offset] = Color(self.r + offset[0], self.g + offset[1], self.b + offset[2])
+        return result
+
     def __sub__(self, other):
-        if isinstance(other, Color):
-            return Color(self.r - other.r, self.g - other.g, self.b - other.b)
-        elif isinstance(other, tuple):
-            return Color(self.r - other[0], self.g - other[1], self.b - other[2])
-        elif isinstance(other, int):
-            return Color(self.r - other, self.g - other, self.b - other)
-        elif isinstance(other, list):
-            return Color(self.r - other[0], self.g - other[1], self.b - other[2])
-        elif isinstance(other, dict):
-            return Color(self.r - other['r'], self.g - other['g'], self.b - other['b'])
-    
+        offset = _offset(other)
+        if offset is None:
+            return NotImplemented
+        result = self.differences.get(offset)
+        if result is None:
+            result = self.differences[offset] = Color(self.r - offset[0], self.g - offset[1], self.b - offset[2])
+        return result
+
+    def __repr__(self):
+        return f"Color{self.tuple}"
+
+
 class Colors:
     BLACK = Color(0, 0, 0)
     WHITE = Color(255, 255, 255)
@@ -63,6 +113,8 @@ class Colors:
     YELLOW = Color(255, 255, 0)
     CYAN = Color(0, 255, 255)
     PURPLE = Color(128, 0, 128)
+    # derived colours used every frame
+    DISABLED = WHITE - Color(100, 100, 100)
     
 class TextShadowEffect:
     def __init__(self, color_offset: Color, pos_offset: tuple):
@@ -75,14 +127,16 @@ class TextShadowEffect:
 class Text(pg.sprite.Sprite):
     def __init__(self, text:str, font:pg.font.Font, color:Color, center:Iterable=None, text_shadow:TextShadowEffect=None, frame_event:callable=None):
         super().__init__()
-        self.image = pg.Surface(font.size(text) if not text_shadow else text_shadow.size_with_offset(font.size(text)), pg.SRCALPHA, 32)
-        # self.image = self.image.convert_alpha()
-        self.font = font
-        self.color = color
-        self.text = font.render(text, True, color.as_iter())
-        self.text_rect = self.text.get_rect()
-        self.text_shadow_obj = text_shadow
-        self.text_shadow = None if not text_shadow else font.render(text, True, (color - text_shadow.color).as_iter())
+        with profiler.section("text"):
+            self.image = pg.Surface(font.size(text) if not text_shadow else text_shadow.size_with_offset(font.size(text)), pg.SRCALPHA, 32)
+            # self.image = self.image.convert_alpha()
+            self.font = font
+            self.color = color
+            self.text = font.render(text, True, color.as_iter())
+            self.text_rect = self.text.get_rect()
+            self.text_shadow_obj = text_shadow
+            self.text_shadow = None if not text_shadow else font.render(text, True, (color - text_shadow.color).as_iter())
+        profiler.count("surfaces", 3 if text_shadow else 2)
         self.text_shadow_rect = None if not text_shadow else self.text_shadow.get_rect()
         self.rect = self.image.get_rect()
         if center:
@@ -117,12 +171,13 @@ class Text(pg.sprite.Sprite):
             self.text_rect.y = 0
     
     def render(self, surface:pg.Surface):
-        if self.text_shadow:
-            self.image.blit(self.text_shadow, self.text_shadow_rect)
-        self.image.blit(self.text, self.text_rect)
-        if not self.center:
-            self.rect = self.image.get_rect(center=surface.get_rect().center)
-        surface.blit(self.image, self.rect)
+        with profiler.section("text"):
+            if self.text_shadow:
+                self.image.blit(self.text_shadow, self.text_shadow_rect)
+            self.image.blit(self.text, self.text_rect)
+            if not self.center:
+                self.rect = self.image.get_rect(center=surface.get_rect().center)
+            surface.blit(self.image, self.rect)
     
     def update(self, events):
         if self.frame_event:
@@ -145,7 +200,51 @@ class ButtonEvent:
     def __call__(self):
         self.callback(self.game)
 
-class Button(pg.sprite.Sprite):
+class Widget(pg.sprite.Sprite):
+    # retained-mode base for the ui: state follows the frame's mouse and key events, the surface is redrawn
+    # only when the state changed and `dirty_rect` is the screen area that changed in the last render.
+    def __init__(self):
+        super().__init__()
+        self.dirty_rect = None
+        self.hovered = False
+        self.drawn_state = None
+        self.drawn_rect = None
+        self.checked_position = None
+
+    def reset(self):
+        self.hovered = False
+        self.checked_position = None
+
+    def mouse_events(self, events):
+        # hover only needs the cursor again after the widget itself moved, otherwise motion events say it all
+        if self.rect.topleft != self.checked_position:
+            self.checked_position = self.rect.topleft
+            self.hovered = self.rect.collidepoint(display.mouse_pos())
+        if pg.MOUSEMOTION not in events and pg.MOUSEBUTTONDOWN not in events and pg.MOUSEBUTTONUP not in events:
+            return ()
+        return [event for event in events if event.type in (pg.MOUSEMOTION, pg.MOUSEBUTTONDOWN, pg.MOUSEBUTTONUP)]
+
+    def state(self):
+        return self.hovered
+
+    def redraw(self):
+        pass
+
+    def render(self, surface:pg.Surface):
+        state = self.state()
+        changed = state != self.drawn_state
+        if changed:
+            self.drawn_state = state
+            self.redraw()
+        if changed or self.rect != self.drawn_rect:
+            self.dirty_rect = self.rect.union(self.drawn_rect) if self.drawn_rect else self.rect.copy()
+            self.drawn_rect = self.rect.copy()
+        else:
+            self.dirty_rect = None
+        surface.blit(self.image, self.rect)
+
+
+class Button(Widget):
     def __init__(self, size:Iterable, center:Iterable, colors:Iterable[Color], text:Text, click_event:ButtonEvent=None):
         super().__init__()
         self.image = pg.Surface((size[0], size[1]))
@@ -156,18 +255,24 @@ class Button(pg.sprite.Sprite):
         self.click_event = click_event
         self.text = text
         
-        self.hovered = False
         self.clicked = False
         
         self.disabled = False
-    
-    def render(self, surface:pg.Surface):
+
+    def reset(self):
+        super().reset()
+        self.clicked = False
+
+    def state(self):
+        return self.disabled, self.hovered, self.clicked
+
+    def redraw(self):
+        self.color_update()
         self.text.render(self.image)
-        surface.blit(self.image, self.rect)
     
     def color_update(self):
         if self.disabled:
-            self.image.fill((Colors.WHITE - Color(100, 100, 100)).as_iter())
+            self.image.fill(Colors.DISABLED.as_iter())
         else:
             if self.hovered:
                 if self.clicked:
@@ -178,49 +283,118 @@ class Button(pg.sprite.Sprite):
                 self.image.fill(self.colors[0].as_iter())
     
     def update(self, events):
-        mouse_position = pg.mouse.get_pos()
-        
-        if not self.disabled:
-            if self.rect.collidepoint(mouse_position):
-                self.hovered = True
-                if pg.MOUSEBUTTONDOWN in events:
-                    self.clicked = True
-                if pg.MOUSEBUTTONUP in events:
-                    if self.clicked:
-                        self.click_event()
-                    self.clicked = False
-            else:
+        for event in self.mouse_events(events):
+            self.hovered = self.rect.collidepoint(event.pos)
+            if not self.hovered:
                 self.clicked = False
-                self.hovered = False
-        
-        self.color_update()
+            elif event.type == pg.MOUSEBUTTONDOWN:
+                self.clicked = True
+            elif event.type == pg.MOUSEBUTTONUP:
+                if self.clicked and not self.disabled:
+                    self.click_event()
+                self.clicked = False
+        if self.disabled:
+            self.clicked = False
+
+class CollisionTable:
+    # Minkowski sum of a hitbox mask and a solid rectangular footprint, built once.
+    # test(dx, dy) answers mask.overlap(footprint, (dx + origin_x, dy + origin_y)) with one lookup.
+    def __init__(self, mask:pg.mask.Mask, footprint_size:Iterable, origin:Iterable=(0, 0)):
+        occupancy = mask.convolve(pg.mask.Mask(footprint_size, fill=True))
+        self.width, self.height = occupancy.get_size()
+        self.shift_x = origin[0] + footprint_size[0] - 1
+        self.shift_y = origin[1] + footprint_size[1] - 1
+        self.table = bytes(occupancy.get_at((x, y)) for y in range(self.height) for x in range(self.width))
+
+    def test(self, dx, dy):
+        x = dx + self.shift_x
+        y = dy + self.shift_y
+        if 0 <= x < self.width and 0 <= y < self.height:
+            return self.table[y * self.width + x]
+        return 0
+
+    def sweep(self, dx0, dy0, dx1, dy1):
+        # tests every offset on the segment travelled between two ticks
+        if dx0 == dx1 and dy0 == dy1:
+            return self.test(dx1, dy1)
+        # broad phase: the segment's bounding box against the table bounds
+        if max(dx0, dx1) + self.shift_x < 0 or min(dx0, dx1) + self.shift_x >= self.width \
+                or max(dy0, dy1) + self.shift_y < 0 or min(dy0, dy1) + self.shift_y >= self.height:
+            return 0
+        steps = max(abs(dx1 - dx0), abs(dy1 - dy0))
+        for step in range(steps + 1):
+            if self.test(dx0 + round((dx1 - dx0) * step / steps), dy0 + round((dy1 - dy0) * step / steps)):
+                return 1
+        return 0
 
 class Player(pg.sprite.Sprite):
-    def __init__(self, center, color:Color=Colors.BLUE):
+    normal_hitbox_set_x = 10
+    normal_hitbox_set_y = 10
+    point_hitbox_expand_x = 20
+    point_hitbox_expand_y = 20
+    # enemies are always solid squares of this size
+    enemy_size = (10, 10)
+    assets = None
+    tints = {}
+
+    def __init__(self, center, color:Color=Colors.BLUE, clock:callable=pg.time.get_ticks, controls:callable=pg.key.get_pressed,
+                 tint:Color=None):
         super().__init__()
-        self.image = pg.image.load("assets/image/player.png")
-        self.image.set_colorkey(Colors.WHITE.as_color())
-        self.normal_hitbox_set_x = 10
-        self.normal_hitbox_set_y = 10
-        self.point_hitbox_expand_x = 20
-        self.point_hitbox_expand_y = 20
-        
-        normal_hitbox = pg.mask.from_surface(self.image)
-        point_hitbox = pg.mask.from_surface(self.image)
-        point_hitbox.fill()
-        
-        self.hitboxes = {
-            "normal_hitbox": normal_hitbox.scale((self.normal_hitbox_set_x, self.normal_hitbox_set_y)),
-            "point_hitbox": point_hitbox.scale((self.normal_hitbox_set_x + self.point_hitbox_expand_x, 
-                                                self.normal_hitbox_set_y + self.point_hitbox_expand_y))
-        }
+        self.image, self.hitboxes, self.collision_tables = Player.load_assets()
+        if tint:
+            self.image = Player.tinted_image(tint)
 
         self.rect = self.image.get_rect(center=center)
         self.speed = 3
         self.speed_diag = self.speed / (2**(1/2))
         self.update_per_second = 80
-        self.last_update_time = pg.time.get_ticks()
+        # clock and controls are swappable so that replays can drive the player headlessly
+        self.clock = clock
+        self.controls = controls
+        self.last_update_time = self.clock()
     
+    @classmethod
+    def read_image(cls):
+        # only the file's bytes, a preload worker may read them but decoding makes a surface
+        with open(path.join(BASEDIR, "assets", "image", "player.png"), "rb") as f:
+            return f.read()
+
+    @classmethod
+    def load_assets(cls, image_bytes=None):
+        # the image, hitboxes and collision tables are the same for every player, so they are built once
+        if cls.assets is None:
+            image = pg.image.load(BytesIO(image_bytes if image_bytes is not None else cls.read_image()), "player.png")
+            image.set_colorkey(Colors.WHITE.as_color())
+
+            normal_hitbox = pg.mask.from_surface(image)
+            point_hitbox = pg.mask.from_surface(image)
+            point_hitbox.fill()
+
+            hitboxes = {
+                "normal_hitbox": normal_hitbox.scale((cls.normal_hitbox_set_x, cls.normal_hitbox_set_y)),
+                "point_hitbox": point_hitbox.scale((cls.normal_hitbox_set_x + cls.point_hitbox_expand_x,
+                                                    cls.normal_hitbox_set_y + cls.point_hitbox_expand_y))
+            }
+            collision_tables = {
+                "normal_hitbox": CollisionTable(hitboxes["normal_hitbox"], cls.enemy_size),
+                "point_hitbox": CollisionTable(hitboxes["point_hitbox"], cls.enemy_size,
+                                               (-(cls.point_hitbox_expand_x // 2), -(cls.point_hitbox_expand_y // 2)))
+            }
+            cls.assets = (image, hitboxes, collision_tables)
+        return cls.assets
+
+    @classmethod
+    def tinted_image(cls, tint):
+        # the green body recoloured, so that players sharing a screen can tell themselves apart
+        if tint not in cls.tints:
+            image = cls.load_assets()[0].copy()
+            pixels = pg.PixelArray(image)
+            pixels.replace(Colors.GREEN.as_iter(), tint.as_iter())
+            pixels.close()
+            image.set_colorkey(Colors.WHITE.as_color())
+            cls.tints[tint] = image
+        return cls.tints[tint]
+
     def set_test_hitbox(self, hitbox_name):
         self.mask = self.hitboxes[hitbox_name]
     
@@ -232,10 +406,10 @@ class Player(pg.sprite.Sprite):
         # surface.blit(self.hitboxes["normal_hitbox"].to_surface(setcolor=Colors.RED.as_iter()), self.rect)
     
     def update(self, events):
-        if pg.time.get_ticks() - self.last_update_time < 1000 / self.update_per_second:
+        steps = _due_steps(self)
+        if not steps:
             return
-        self.last_update_time = pg.time.get_ticks()
-        keys = pg.key.get_pressed()
+        keys = self.controls()
         if ((not keys[pg.K_w] and keys[pg.K_s]) or (keys[pg.K_w] and not keys[pg.K_s])) \
             and ((not keys[pg.K_a] and keys[pg.K_d]) or (keys[pg.K_a] and not keys[pg.K_d])):
             speed = self.speed_diag
@@ -245,19 +419,22 @@ class Player(pg.sprite.Sprite):
         if keys[pg.K_LSHIFT] or keys[pg.K_RSHIFT]:
             speed *= 2
         
-        if keys[pg.K_w]:
-            self.rect.y -= speed
-        if keys[pg.K_s]:
-            self.rect.y += speed
-        if keys[pg.K_a]:
-            self.rect.x -= speed
-        if keys[pg.K_d]:
-            self.rect.x += speed
+        for _ in range(steps):
+            if keys[pg.K_w]:
+                self.rect.y -= speed
+            if keys[pg.K_s]:
+                self.rect.y += speed
+            if keys[pg.K_a]:
+                self.rect.x -= speed
+            if keys[pg.K_d]:
+                self.rect.x += speed
 
 class Enemy(pg.sprite.Sprite):
-    def __init__(self, x_change, y_change, target_pos, start_x: bool, start_full: bool, screen_size: int, color:Color=Colors.RED):
+    def __init__(self, x_change, y_change, target_pos, start_x: bool, start_full: bool, screen_size: int, color:Color=Colors.RED,
+                 clock:callable=pg.time.get_ticks, rng=None):
         super().__init__()
         self.image = pg.Surface((10, 10))
+        profiler.count("surfaces")
         self.image.set_colorkey(Colors.GREEN.as_color())
         self.mask = pg.mask.from_surface(self.image)
         self.image.fill(color.as_iter())
@@ -265,10 +442,11 @@ class Enemy(pg.sprite.Sprite):
         
         self.x_change = x_change  # assume x_change and y_change are both not 0
         self.y_change = y_change
+        rand = rng.randint if rng else randint
         if self.x_change == 0:
-            self.x_change = -1 if randint(0, 1) == 0 else 1
+            self.x_change = -1 if rand(0, 1) == 0 else 1
         if self.y_change == 0:
-            self.y_change = -1 if randint(0, 1) == 0 else 1
+            self.y_change = -1 if rand(0, 1) == 0 else 1
             
         self.tilt = self.y_change / self.x_change
         
@@ -295,32 +473,76 @@ class Enemy(pg.sprite.Sprite):
                 self.end_pos = (self.y_function(screen_size[1]), screen_size[1])
         
         self.rect = self.image.get_rect(center=start_pos)
+        # position at the last collision check, for swept collision
+        self.previous_pos = self.rect.topleft
         
         self.counted = False
         
-        self.last_update_time = pg.time.get_ticks()
+        self.clock = clock
+        self.last_update_time = self.clock()
         self.update_per_second = 60
     
     def f(self, x):
         return self.tilt * (x - self.target_pos[0]) + self.target_pos[1]
     
     def update(self, events):
-        if pg.time.get_ticks() - self.last_update_time < 1000 / self.update_per_second:
-            return
-        self.last_update_time = pg.time.get_ticks()
-        self.rect.x += self.x_change * self.change_multiply
-        self.rect.y += self.y_change * self.change_multiply
-        if (self.rect.x, self.rect.y) == self.end_pos:
-            self.kill()
+        for _ in range(_due_steps(self)):
+            self.rect.x += self.x_change * self.change_multiply
+            self.rect.y += self.y_change * self.change_multiply
+            if (self.rect.x, self.rect.y) == self.end_pos:
+                self.kill()
+                return
             
     
     def render(self, surface:pg.Surface):
         surface.blit(self.image, self.rect)
 
+class Projectile(pg.sprite.Sprite):
+    # Enemy-style 10x10 square moving on a straight line, made in bulk by formations.
+    # every projectile shares one surface, so creating one is only a few attribute stores.
+    images = {}
+
+    def __init__(self, x, y, velocity_x, velocity_y, bounds:pg.Rect, clock:callable, color:Color=Colors.RED):
+        super().__init__()
+        if color not in Projectile.images:
+            Projectile.images[color] = pg.Surface((10, 10))
+            Projectile.images[color].fill(color.as_iter())
+            profiler.count("surfaces")
+        self.image = Projectile.images[color]
+        self.rect = pg.Rect(int(x) - 5, int(y) - 5, 10, 10)
+        self.previous_pos = self.rect.topleft
+        self.x = float(self.rect.x)
+        self.y = float(self.rect.y)
+        self.velocity_x = velocity_x
+        self.velocity_y = velocity_y
+        self.counted = False
+        self.entered = False
+        self.bounds = bounds
+        self.clock = clock
+        self.last_update_time = clock()
+        self.update_per_second = 60
+
+    def update(self, events):
+        for _ in range(_due_steps(self)):
+            self.x += self.velocity_x
+            self.y += self.velocity_y
+            self.rect.x = int(self.x)
+            self.rect.y = int(self.y)
+            # straight lines never come back, so a projectile is dropped once it has crossed the screen
+            if self.bounds.colliderect(self.rect):
+                self.entered = True
+            elif self.entered:
+                self.kill()
+                return
+
+    def render(self, surface:pg.Surface):
+        surface.blit(self.image, self.rect)
+
 class Star(pg.sprite.Sprite):
     def __init__(self, x, y, color:Color=Colors.WHITE):
         super().__init__()
         self.image = pg.Surface((2, 2))
+        profiler.count("surfaces")
         self.image.set_alpha(0)
         self.image.fill(color.as_iter())
         self.rect = self.image.get_rect(center=(x, y))
@@ -344,7 +566,7 @@ class Star(pg.sprite.Sprite):
     def render(self, surface):
         surface.blit(self.image, self.rect)
 
-class NumberInputBox(pg.sprite.Sprite):
+class NumberInputBox(Widget):
     def __init__(self, x, y, width, height, colors: Iterable[Color], font):
         super().__init__()
         self.image = pg.Surface((width+2, height+2))
@@ -378,53 +600,36 @@ class NumberInputBox(pg.sprite.Sprite):
         self.font = font
         self.limit = 5
         
-        self.hovered = False
         self.pressed = False
         self.activated = False
     
     def update(self, events):
-        if self.rect.collidepoint(pg.mouse.get_pos()):
-            self.hovered = True
-            if not self.pressed and pg.mouse.get_pressed()[0]:
-                self.pressed = True
-            elif self.pressed and not pg.mouse.get_pressed()[0]:
+        for event in self.mouse_events(events):
+            inside = self.rect.collidepoint(event.pos)
+            self.hovered = inside
+            if event.type == pg.MOUSEBUTTONDOWN and event.button == 1:
+                if inside:
+                    self.pressed = True
+                elif self.activated:
+                    self.activated = False
+            elif event.type == pg.MOUSEBUTTONUP and event.button == 1:
+                if self.pressed and inside:
+                    self.activated = True
+                self.pressed = False
+            elif not inside:
                 self.pressed = False
-                self.activated = True
-        elif self.activated and pg.mouse.get_pressed()[0]:
-            self.activated = False
-            self.pressed = False
-            self.hovered = False
-        else:
-            self.hovered = False
-            self.pressed = False
         
-        if self.activated:  # key input event
-            if pg.KEYDOWN in events:
-                if len(self.get_text()) < self.limit:
-                    if pg.key.get_pressed()[pg.K_1]:
-                        self.text += "1"
-                    if pg.key.get_pressed()[pg.K_2]:
-                        self.text += "2"
-                    if pg.key.get_pressed()[pg.K_3]:
-                        self.text += "3"
-                    if pg.key.get_pressed()[pg.K_4]:
-                        self.text += "4"
-                    if pg.key.get_pressed()[pg.K_5]:
-                        self.text += "5"
-                    if pg.key.get_pressed()[pg.K_6]:
-                        self.text += "6"
-                    if pg.key.get_pressed()[pg.K_7]:
-                        self.text += "7"
-                    if pg.key.get_pressed()[pg.K_8]:
-                        self.text += "8"
-                    if pg.key.get_pressed()[pg.K_9]:
-                        self.text += "9"
-                    if pg.key.get_pressed()[pg.K_0]:
-                        self.text += "0"
-                if pg.key.get_pressed()[pg.key.key_code("backspace")]:
+        if self.activated:  # key input event, every key pressed in this frame in order
+            for event in events.key_down():
+                if event.key == pg.K_BACKSPACE:
                     self.text = self.text[:-1]
+                elif event.key in DIGIT_KEYS and len(self.text) < self.limit:
+                    self.text += DIGIT_KEYS[event.key]
+
+    def state(self):
+        return self.text, self.activated, self.pressed, self.hovered
     
-    def render(self, surface):
+    def redraw(self):
         if self.activated:
             self.image.fill(self.colors["active"]["background"].as_iter())
         elif self.pressed:
@@ -445,7 +650,6 @@ class NumberInputBox(pg.sprite.Sprite):
         
         text = self.font.render(self.text, True, self.colors["normal"]["text"].as_iter())
         self.image.blit(text, (self.rect.width / 2 - text.get_width() / 2, self.rect.height / 2 - text.get_height() / 2))
-        surface.blit(self.image, self.rect)
     
     def get_text(self):
         return self.text
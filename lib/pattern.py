@@ -0,0 +1,98 @@
+from array import array
+from functools import lru_cache
+from math import atan2, cos, sin, radians, pi
+from pathlib import Path
+from os import path
+import json
+
+from lib.object import Projectile, Colors
+
+BASEDIR = Path(__file__).parent.parent.absolute()
+FORMATIONS_FILE = path.join(BASEDIR, 'assets', 'patterns', 'formations.json')
+
+
+class Formation:
+    # a formation compiled once into offsets from its origin and per-tick velocities.
+    # aimed formations keep their velocities relative to the aim direction and are rotated at spawn time.
+    def __init__(self, name, spec):
+        self.name = name
+        self.kind = spec["type"]
+        count = spec["count"]
+        speed = spec["speed"]
+        self.aimed = False
+        self.edge = None
+        self.offsets_x = array('d')
+        self.offsets_y = array('d')
+        self.velocities_x = array('d')
+        self.velocities_y = array('d')
+
+        if self.kind in ("ring", "spiral"):
+            # projectiles on a circle (or spiral) around the player, all flying to its center
+            phase = radians(spec.get("phase", 0))
+            turns = spec.get("turns", 1) if self.kind == "spiral" else 1
+            radius_start = spec.get("radius", spec.get("radius_start"))
+            radius_end = spec.get("radius", spec.get("radius_end"))
+            for index in range(count):
+                angle = phase + 2 * pi * turns * index / count
+                radius = radius_start + (radius_end - radius_start) * index / count
+                self.add(radius * cos(angle), radius * sin(angle), -speed * cos(angle), -speed * sin(angle))
+        elif self.kind == "line":
+            # a wall entering from one edge, centered on the player's coordinate along that edge
+            self.edge = spec["edge"]
+            spacing = spec["spacing"]
+            direction = {"top": (0, 1), "bottom": (0, -1), "left": (1, 0), "right": (-1, 0)}[self.edge]
+            for index in range(count):
+                along = (index - (count - 1) / 2) * spacing
+                if direction[0] == 0:
+                    self.add(along, 0, 0, speed * direction[1])
+                else:
+                    self.add(0, along, speed * direction[0], 0)
+        elif self.kind == "aimed_burst":
+            # a fan from a random edge point, centered on the direction to the player
+            self.aimed = True
+            spread = radians(spec["spread"])
+            for index in range(count):
+                angle = spread * (index / (count - 1) - 0.5) if count > 1 else 0
+                self.add(0, 0, speed * cos(angle), speed * sin(angle))
+        else:
+            raise ValueError(f"Unknown formation type '{self.kind}' in '{name}'")
+
+    def add(self, offset_x, offset_y, velocity_x, velocity_y):
+        self.offsets_x.append(offset_x)
+        self.offsets_y.append(offset_y)
+        self.velocities_x.append(velocity_x)
+        self.velocities_y.append(velocity_y)
+
+    def origin(self, target, screen_size, rng):
+        if self.kind in ("ring", "spiral"):
+            return target
+        if self.edge == "top":
+            return target[0], -10
+        if self.edge == "bottom":
+            return target[0], screen_size[1] + 10
+        if self.edge == "left":
+            return -10, target[1]
+        if self.edge == "right":
+            return screen_size[0] + 10, target[1]
+        # aimed bursts start on a random point of the screen border
+        side = rng.randint(0, 3)
+        along = rng.randint(0, screen_size[0] if side < 2 else screen_size[1])
+        return ((along, -10), (along, screen_size[1] + 10), (-10, along), (screen_size[0] + 10, along))[side]
+
+    def spawn(self, target, screen_size, rng, bounds, clock, color=Colors.RED):
+        origin_x, origin_y = self.origin(target, screen_size, rng)
+        if self.aimed:
+            aim = atan2(target[1] - origin_y, target[0] - origin_x)
+            aim_cos, aim_sin = cos(aim), sin(aim)
+            return [Projectile(origin_x, origin_y, velocity_x * aim_cos - velocity_y * aim_sin,
+                               velocity_x * aim_sin + velocity_y * aim_cos, bounds, clock, color)
+                    for velocity_x, velocity_y in zip(self.velocities_x, self.velocities_y)]
+        return [Projectile(origin_x + offset_x, origin_y + offset_y, velocity_x, velocity_y, bounds, clock, color)
+                for offset_x, offset_y, velocity_x, velocity_y
+                in zip(self.offsets_x, self.offsets_y, self.velocities_x, self.velocities_y)]
+
+
+@lru_cache(maxsize=None)
+def load_formations():
+    with open(FORMATIONS_FILE, "r", encoding="utf-8") as f:
+        return {name: Formation(name, spec) for name, spec in json.load(f).items()}
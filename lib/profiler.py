@@ -0,0 +1,137 @@
+from collections import deque
+from time import perf_counter
+import csv
+import json
+
+import pygame as pg
+
+
+class _Section:
+    def __init__(self, profiler, key):
+        self.profiler = profiler
+        self.key = key
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        timings = self.profiler.timings
+        timings[self.key] = timings.get(self.key, 0) + (perf_counter() - self.start)
+
+
+class _NullSection:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+NULL_SECTION = _NullSection()
+
+
+class FrameProfiler:
+    # collects per-frame timings (seconds) and counters.
+    # every call is a no-op while disabled so the hooks can stay in the hot paths.
+    def __init__(self, history=120, max_recorded_frames=100000):
+        self.enabled = False
+        self.overlay = False
+        self.dump_path = None
+        self.timings = {}
+        self.counters = {}
+        self.counter_names = set()
+        self.history = deque(maxlen=history)
+        self.recorded = []
+        self.max_recorded_frames = max_recorded_frames
+        self.frame_start = None
+        self.overlay_font = None
+
+    def enable(self, dump_path=None):
+        self.enabled = True
+        if dump_path:
+            self.dump_path = dump_path
+
+    def toggle_overlay(self):
+        self.overlay = not self.overlay
+        if self.overlay:
+            self.enabled = True
+        elif not self.dump_path:
+            self.enabled = False
+
+    def section(self, name, detail=None):
+        if not self.enabled:
+            return NULL_SECTION
+        return _Section(self, name if detail is None else f"{name}.{detail}")
+
+    def count(self, name, amount=1, detail=None):
+        if self.enabled:
+            name = name if detail is None else f"{name}.{detail}"
+            self.counters[name] = self.counters.get(name, 0) + amount
+            self.counter_names.add(name)
+
+    def set_counter(self, name, value, detail=None):
+        if self.enabled:
+            name = name if detail is None else f"{name}.{detail}"
+            self.counters[name] = value
+            self.counter_names.add(name)
+
+    def begin_frame(self):
+        if self.enabled:
+            self.timings = {}
+            self.counters = {}
+            self.frame_start = perf_counter()
+
+    def end_frame(self):
+        if not self.enabled or self.frame_start is None:
+            return
+        frame = {"frame": perf_counter() - self.frame_start}
+        frame.update(self.timings)
+        frame.update(self.counters)
+        self.history.append(frame)
+        if self.dump_path and len(self.recorded) < self.max_recorded_frames:
+            self.recorded.append(frame)
+
+    def summary(self):
+        # average of every column over the overlay history
+        totals = {}
+        for frame in self.history:
+            for key, value in frame.items():
+                totals[key] = totals.get(key, 0) + value
+        return {key: value / len(self.history) for key, value in totals.items()}
+
+    def render_overlay(self, surface):
+        if not self.overlay or not self.history:
+            return
+        if self.overlay_font is None:
+            self.overlay_font = pg.font.Font(None, 18)
+        y = 4
+        for key, value in sorted(self.summary().items()):
+            if key in self.counter_names:
+                line = f"{key}: {value:.0f}"
+            else:
+                line = f"{key}: {value * 1000:.3f} ms"
+            text = self.overlay_font.render(line, True, (0, 255, 0), (0, 0, 0))
+            surface.blit(text, (4, y))
+            y += text.get_height()
+
+    def dump(self, dump_path=None):
+        dump_path = dump_path or self.dump_path
+        if not dump_path or not self.recorded:
+            return
+        if dump_path.endswith(".json"):
+            with open(dump_path, "w", encoding="utf-8") as f:
+                json.dump(self.recorded, f)
+        else:
+            columns = []
+            for frame in self.recorded:
+                for key in frame:
+                    if key not in columns:
+                        columns.append(key)
+            with open(dump_path, "w", encoding="utf-8", newline="") as f:
+                writer = csv.DictWriter(f, fieldnames=columns)
+                writer.writeheader()
+                writer.writerows(self.recorded)
+
+
+profiler = FrameProfiler()
@@ -0,0 +1,134 @@
+from base64 import urlsafe_b64encode, urlsafe_b64decode
+from struct import Struct
+import zlib
+
+import pygame as pg
+
+# replay blob layout (before zlib + base64):
+#   header: magic, version, seed, screen width, screen height, flags, difficulty profile name (16 bytes)
+#   frames: varint(ms since previous frame) + 1 byte key mask, repeated
+MAGIC = b"DGRP"
+# 4: sprites carry the time past their last update, runs of earlier versions would simulate differently
+VERSION = 4
+HEADER = Struct("<4sBIHHB16s")
+# the difficulty name field of HEADER, longer names would be cut and could not be loaded again on replay
+MAX_DIFFICULTY_NAME = 16
+
+FLAG_SWEPT_COLLISION = 1
+
+KEY_BITS = (pg.K_w, pg.K_a, pg.K_s, pg.K_d, pg.K_LSHIFT, pg.K_RSHIFT)
+
+
+def encode_keys(keys):
+    mask = 0
+    for bit, key in enumerate(KEY_BITS):
+        if keys[key]:
+            mask |= 1 << bit
+    return mask
+
+
+class KeyState:
+    def __init__(self, mask):
+        self.mask = mask
+
+    def __getitem__(self, key):
+        if key not in KEY_BITS:
+            return False
+        return bool(self.mask & (1 << KEY_BITS.index(key)))
+
+
+def difficulty_name_bytes(difficulty):
+    # the profile name as stored in the header, a name that would not survive the trip raises
+    try:
+        name = difficulty.encode("ascii")
+    except UnicodeEncodeError:
+        raise ValueError(f"Difficulty profile name '{difficulty}' must be ascii to be stored in a replay")
+    if len(name) > MAX_DIFFICULTY_NAME:
+        raise ValueError(f"Difficulty profile name '{difficulty}' is longer than {MAX_DIFFICULTY_NAME} bytes "
+                         f"and can not be stored in a replay")
+    return name
+
+
+class ReplayRecorder:
+    def __init__(self, seed, screen_size, started_time, flags=0, difficulty="default"):
+        name = difficulty_name_bytes(difficulty)
+        self.header = HEADER.pack(MAGIC, VERSION, seed, screen_size[0], screen_size[1], flags, name)
+        self.frames = bytearray()
+        self.last_time = started_time
+
+    def record(self, now, keys):
+        delta = now - self.last_time
+        self.last_time = now
+        while delta >= 0x80:
+            self.frames.append((delta & 0x7f) | 0x80)
+            delta >>= 7
+        self.frames.append(delta)
+        self.frames.append(encode_keys(keys))
+
+    def dump(self):
+        return urlsafe_b64encode(zlib.compress(self.header + bytes(self.frames), 9)).decode("ascii")
+
+
+def read_header(blob):
+    raw = zlib.decompressobj().decompress(urlsafe_b64decode(blob), HEADER.size)
+    magic, version, seed, width, height, flags, difficulty = HEADER.unpack(raw)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Unsupported replay format")
+    return {"seed": seed, "screen_size": (width, height), "flags": flags,
+            "difficulty": difficulty.rstrip(b"\0").decode("ascii")}
+
+
+def _decompressed_chunks(data_chunks):
+    decompressor = zlib.decompressobj()
+    for data in data_chunks:
+        yield decompressor.decompress(data)
+    yield decompressor.flush()
+
+
+def _blob_data(blob, chunk_size):
+    data = urlsafe_b64decode(blob)
+    for start in range(0, len(data), chunk_size):
+        yield data[start:start + chunk_size]
+
+
+def _file_data(file, chunk_size):
+    # base64 only decodes on 4 character boundaries
+    chunk_size -= chunk_size % 4
+    while chunk := file.read(chunk_size).rstrip():
+        yield urlsafe_b64decode(chunk)
+
+
+def _parse_frames(chunks):
+    header = bytearray()
+    now = 0
+    delta = 0
+    shift = 0
+    for chunk in chunks:
+        if len(header) < HEADER.size:
+            needed = HEADER.size - len(header)
+            header += chunk[:needed]
+            chunk = chunk[needed:]
+            if len(header) == HEADER.size and (header[:4] != MAGIC or header[4] != VERSION):
+                raise ValueError("Unsupported replay format")
+        for byte in chunk:
+            if shift == -1:
+                now += delta
+                yield now, KeyState(byte)
+                delta = 0
+                shift = 0
+            elif byte & 0x80:
+                delta |= (byte & 0x7f) << shift
+                shift += 7
+            else:
+                delta |= byte << shift
+                shift = -1
+
+
+def iter_frames(blob, chunk_size=4096):
+    # decompresses incrementally, yields (time since start, KeyState)
+    return _parse_frames(_decompressed_chunks(_blob_data(blob, chunk_size)))
+
+
+def iter_file_frames(file, chunk_size=4096):
+    # the same for a blob stored in an open text file, which is read one chunk at a time
+    return _parse_frames(_decompressed_chunks(_file_data(file, chunk_size)))
@@ -1,35 +1,100 @@
 from typing import Iterable
 from random import randint
 from random import choice
+from random import uniform
 from pathlib import Path
-from os import path
+from os import path, listdir
+from functools import lru_cache
 import pygame as pg
-import requests
-from requests.exceptions import Timeout, ConnectionError
 from time import sleep
 from threading import Thread
-from datetime import datetime
-from datetime import timezone, timedelta
 
 from lib.object import Star
-from lib.object import Text, Color, Button, Colors, ButtonEvent, TextShadowEffect, NumberInputBox
-from lib.object import Player, Enemy
+from lib.object import Text, Color, Button, Colors, ButtonEvent, TextShadowEffect, NumberInputBox, Widget
+from lib.object import Player
+from lib.simulation import DodgeSimulation
+from lib.difficulty import load_difficulty
+from lib.pattern import load_formations
+from lib.profiler import profiler
+from lib.telemetry import telemetry, FrameStats
+from lib.display import display
+from lib.ghost import Ghost, save_ghost
 
 BASEDIR = Path(__file__).parent.parent.absolute()
 
 
+@lru_cache(maxsize=None)
+def http():
+    # requests pulls in urllib3, certifi and friends, a tenth of a second of imports the first frame does not need.
+    # Game warms it on a thread once the id input is shown
+    import requests
+    return requests
+
+
+def api_request(gameObject, method, endpoint, retries=0, **kwargs):
+    # the api refuses a school's address for a moment when its kiosks ask too much at once.
+    # a 429 is tried again `retries` times after the Retry-After the api sent, the waits grow and are jittered
+    # so that kiosks refused together do not come back together
+    requests = http()
+    for attempt in range(retries + 1):
+        res = requests.request(method, f"{gameObject.api_url}{endpoint}", **kwargs)
+        if res.status_code != 429 or attempt == retries:
+            return res
+        try:
+            retry_after = float(res.headers.get("Retry-After", 0))
+        except ValueError:
+            retry_after = 0
+        sleep(min(max(retry_after, 0.5 * 2 ** attempt), 10) + uniform(0, 0.5))
+
+
+@lru_cache(maxsize=None)
 def font_located(fontname):
     res_path = path.join(BASEDIR, 'assets', 'font', fontname + '.ttf')
     if not path.exists(res_path):
-        return f'assets/font/{fontname}.ttf'
+        # font files are looked up case-insensitively (INVASION2000.TTF) on case-sensitive filesystems,
+        # a font that is not shipped at all falls back to the pygame default font
+        for filename in listdir(path.join(BASEDIR, 'assets', 'font')):
+            if filename.lower() == (fontname + '.ttf').lower():
+                return path.join(BASEDIR, 'assets', 'font', filename)
+        return None
     return res_path
+
+
+@lru_cache(maxsize=None)
+def _load_font_file(res_path, size):
+    return pg.font.Font(res_path, size)
+
+
+def load_font(fontname, size):
+    # fonts are shared between scenes instead of being read from disk on every scene construction
+    return _load_font_file(font_located(fontname), size)
     
 
 class Scene:
+    cacheable = False
+    # "static" screens only change on input and may idle, "animated" and "game" run clock-locked
+    frame_mode = "animated"
+    # signed-in screens that go back to the id input after the idle timeout
+    attract_on_idle = False
+
     def __init__(self):
         self.groups = {}
         self.raws = {}
 
+    def resume(self, data):
+        pass
+
+    @classmethod
+    def preload(cls, gameObject):
+        # runs on a worker thread while the previous scene is still animating. only file reads and decoding,
+        # fonts and surfaces are not thread-safe and are made by warm() on the main thread
+        return {}
+
+    @classmethod
+    def warm(cls, gameObject, preloaded):
+        # the main thread half of a preload, run in a frame of the previous scene once preload() is done
+        return preloaded
+
     def add_item(self, name, *sprites: Iterable[pg.sprite.Sprite]):
         self.groups[name].add(sprites)
 
@@ -44,16 +109,25 @@ class Scene:
         del self.groups[name]
 
     def update(self, events):
-        for groups in self.groups.values():
-            groups.update(events)
+        for name, groups in self.groups.items():
+            with profiler.section("update", name):
+                groups.update(events)
+            profiler.set_counter("sprites", len(groups), name)
 
     def render(self, screen):
-        for groups in self.groups.values():
-            for item in groups:
-                item.render(screen)
+        for name, groups in self.groups.items():
+            with profiler.section("render", name):
+                for item in groups:
+                    item.render(screen)
+
+        with profiler.section("render", "raws"):
+            for item, center in self.raws.values():
+                screen.blit(item, item.get_rect(center=center))
 
-        for item, center in self.raws.values():
-            screen.blit(item, item.get_rect(center=center))
+    def dirty_rects(self):
+        # screen areas the widgets changed in the last render, empty while the ui sits still
+        return [sprite.dirty_rect for group in self.groups.values() for sprite in group
+                if isinstance(sprite, Widget) and sprite.dirty_rect]
 
     def inherit_groups(self, *group_names):
         return {name: self.groups[name] for name in group_names}
@@ -63,12 +137,14 @@ star_effect_delay = 250
 
 
 class StudentIDInputScene(Scene):
+    frame_mode = "static"
+
     def __init__(self, gameObject, data):
         super().__init__()
         self.screen_color = Colors.WHITE.as_iter()
         self.gameObject = gameObject
 
-        title_font = pg.font.Font(font_located('BlackHanSans-Regular'), 40)
+        title_font = load_font('BlackHanSans-Regular', 40)
         title = Text("학번을 입력해주세요.",
                      title_font,
                      Colors.ORANGE,
@@ -80,7 +156,7 @@ class StudentIDInputScene(Scene):
 
         self.create_group('title', title)
 
-        input_font = pg.font.Font(font_located('ONE Mobile Bold'), 30)
+        input_font = load_font('ONE Mobile Bold', 30)
         inputbox = NumberInputBox(
             gameObject.screen.get_width() / 2,
             gameObject.screen.get_height() / 2,
@@ -110,9 +186,10 @@ class StudentIDInputScene(Scene):
             gameObject.student_grade = int(inputted_id[0])
             gameObject.student_class = int(inputted_id[1:3])
             gameObject.student_number = int(inputted_id[3:])
+            telemetry.set_context(player=inputted_id)
             gameObject.change_scene(IDMenuTransition)
 
-        button_font = pg.font.Font(font_located('ONE Mobile Bold'), 30)
+        button_font = load_font('ONE Mobile Bold', 30)
         game_start_button = Button(
             (gameObject.screen.get_width() / 4, gameObject.screen.get_height() / 12),
             (gameObject.screen.get_width() / 2, gameObject.screen.get_height() / 10 * 8),
@@ -155,7 +232,7 @@ class IDMenuTransition(Scene):
             "이 게임은 총 1,144줄의 코드로 구성되어 있습니다."
         ]
 
-        tip_font = pg.font.Font(font_located('ONE Mobile Light'), 10)
+        tip_font = load_font('ONE Mobile Light', 10)
         tip_text = Text(
             "" + choice(tip_messages),
             tip_font,
@@ -164,7 +241,7 @@ class IDMenuTransition(Scene):
         )
         self.create_group('tip', tip_text)
 
-        loading_font = pg.font.Font(font_located('ONE Mobile Bold'), 30)
+        loading_font = load_font('ONE Mobile Bold', 30)
         loading_text = Text(
             "로딩 중...",
             loading_font,
@@ -193,8 +270,11 @@ class IDMenuTransition(Scene):
         super().update(events)
         if not self.server_check_break and (
                 not self.server_ok and self.server_check_retries < self.server_check_retries_max):
+            requests = http()
             try:
-                res = requests.get(f'{self.gameObject.api_url}/check')
+                with telemetry.request("/check") as call:
+                    res = api_request(self.gameObject, "GET", "/check")
+                    call.status = res.status_code
                 if res.status_code == 200:
                     self.server_ok = True
                     new_text = self.groups['loading_status'].sprites()[0].get_another_text("서버 연결 성공!")
@@ -203,11 +283,11 @@ class IDMenuTransition(Scene):
                     self.server_check_retries += 1
                     new_text = self.groups['loading_status'].sprites()[0].get_another_text("서버 연결 확인 실패! 재시도 중..")
                     self.groups['loading_status'].add(new_text)
-            except Timeout as e:
+            except requests.Timeout as e:
                 self.server_check_retries += 1
                 new_text = self.groups['loading_status'].sprites()[0].get_another_text("서버 연결 확인 실패! 재시도 중..")
                 self.groups['loading_status'].add(new_text)
-            except ConnectionError as e:
+            except requests.ConnectionError as e:
                 self.server_check_break = True
                 new_text = self.groups['loading_status'].sprites()[0].get_another_text("서버 연결에 실패했습니다. 인터넷 상태를 확인하세요.")
                 self.groups['loading_status'].add(new_text)
@@ -235,61 +315,28 @@ class IDMenuTransition(Scene):
 
 
 class MenuScene(Scene):
+    # kept by Game after the first visit, coming back only runs resume()
+    cacheable = True
+    frame_mode = "static"
+    attract_on_idle = True
+
     def __init__(self, gameObject, data):
         super().__init__()
         self.screen_color = Colors.BLACK.as_iter()
+        self.gameObject = gameObject
 
-        title_font = pg.font.Font(font_located('BlackHanSans-Regular'), 40)
-        smaller_title_font = pg.font.Font(font_located('BlackHanSans-Regular'), 27)
-
-        if gameObject.offline:
-            playcount_text = Text(
-                f"오프라인 모드 {'(서버 인증 키 확인 실패)' if not gameObject.api_authkey else ''}",
-                smaller_title_font,
-                Colors.BLACK + Color(100, 100, 100),
-                (
-                    gameObject.screen.get_width() / 2,
-                    gameObject.screen.get_height() / 6 - 100
-                ),
-                TextShadowEffect(Colors.BLACK + Color(120, 120, 120), (2, 2))
-            )
-        else:
-            try:
-                res = requests.get(f'{gameObject.api_url}/get-playcount',
-                                   params={'player_id': gameObject.student_id},
-                                   timeout=5)
-                if res.status_code == 200:
-                    print(res.json())
-                    playcount = res.json()['count']
-                else:
-                    playcount = 0
-            except Timeout as e:
-                playcount = 0
-            except ConnectionError as e:
-                playcount = 0
-            gameObject.playable = gameObject.playable_count - playcount
-            playcount_text = Text(
-                f"플레이 가능 횟수: {gameObject.playable}회",
-                smaller_title_font,
-                Colors.BLACK + Color(100, 100, 100),
-                (
-                    gameObject.screen.get_width() / 2,
-                    gameObject.screen.get_height() / 6 - 100
-                ),
-                TextShadowEffect(Colors.BLACK + Color(120, 120, 120), (2, 2))
-            )
-        self.create_group('playcount', playcount_text)
+        title_font = load_font('BlackHanSans-Regular', 40)
+        self.smaller_title_font = load_font('BlackHanSans-Regular', 27)
 
-        button_font = pg.font.Font(font_located('ONE Mobile Bold'), 30)
-        title = Text("부평고 2022 코딩동아리 게임",
-                     title_font,
-                     Colors.ORANGE,
-                     (
-                         gameObject.screen.get_width() / 2,
-                         gameObject.screen.get_height() / 6
-                     ),
-                     TextShadowEffect(Colors.ORANGE + Color(20, 20, 20), (2, 2)))
-        self.create_group("title", title)
+        button_font = load_font('ONE Mobile Bold', 30)
+        self.title = Text("부평고 2022 코딩동아리 게임",
+                          title_font,
+                          Colors.ORANGE,
+                          (
+                              gameObject.screen.get_width() / 2,
+                              gameObject.screen.get_height() / 6
+                          ),
+                          TextShadowEffect(Colors.ORANGE + Color(20, 20, 20), (2, 2)))
 
         BUTTON_COLOR = [
             Colors.ORANGE,
@@ -297,7 +344,7 @@ class MenuScene(Scene):
             Colors.RED - Color(100, 0, 0)
         ]
 
-        start_button = Button(
+        self.start_button = Button(
             (200, 50),
             (
                 gameObject.screen.get_width() / 2,
@@ -330,10 +377,35 @@ class MenuScene(Scene):
             Text("종료하기", button_font, Colors.WHITE),
             ButtonEvent(gameObject, lambda gameObject: gameObject.quit())
         )
-        if not gameObject.offline:
-            if gameObject.playable == 0:
-                start_button.disabled = True
-        self.create_group("buttons", start_button, help_button, quit_button)
+        self.buttons = [self.start_button, help_button, quit_button]
+        # MenuGameTransition pushes the title and buttons off screen, resume() puts them back
+        self.home_positions = [(sprite, sprite.rect.center) for sprite in [self.title] + self.buttons]
+
+        self.playcount_thread = None
+        self.playcount = None
+        self.create_group('playcount')
+        self.resume(data)
+
+    def resume(self, data):
+        for sprite, center in self.home_positions:
+            sprite.rect.center = center
+        for button in self.buttons:
+            button.disabled = False
+            button.reset()
+        self.create_group("title", self.title)
+        self.create_group("buttons", *self.buttons)
+        # GameScene and the local best run's ghost get ready while the menu is shown
+        self.gameObject.preload_scene(GameScene)
+
+        if self.gameObject.offline:
+            self.set_playcount_text(f"오프라인 모드 {'(서버 인증 키 확인 실패)' if not self.gameObject.api_authkey else ''}")
+        else:
+            # the play count is fetched in the background, starting waits for it
+            self.start_button.disabled = True
+            self.playcount = None
+            self.set_playcount_text("플레이 가능 횟수 확인 중..")
+            self.playcount_thread = Thread(target=self.fetch_playcount, daemon=True)
+            self.playcount_thread.start()
 
         # for star effect
         if "inheritGroups" in data and "stars" in data["inheritGroups"]:
@@ -345,12 +417,49 @@ class MenuScene(Scene):
         else:
             self.last_star_creation = pg.time.get_ticks()
 
+    def fetch_playcount(self):
+        requests = http()
+        try:
+            with telemetry.request("/get-playcount") as call:
+                res = api_request(self.gameObject, "GET", "/get-playcount",
+                                  params={'player_id': self.gameObject.student_id},
+                                  timeout=5)
+                call.status = res.status_code
+            if res.status_code == 200:
+                print(res.json())
+                playcount = res.json()['count']
+            else:
+                playcount = 0
+        except requests.Timeout as e:
+            playcount = 0
+        except requests.ConnectionError as e:
+            playcount = 0
+        self.playcount = playcount
+
+    def set_playcount_text(self, text):
+        self.groups['playcount'].empty()
+        self.add_item('playcount', Text(
+            text,
+            self.smaller_title_font,
+            Colors.BLACK + Color(100, 100, 100),
+            (
+                self.gameObject.screen.get_width() / 2,
+                self.gameObject.screen.get_height() / 6 - 100
+            ),
+            TextShadowEffect(Colors.BLACK + Color(120, 120, 120), (2, 2))
+        ))
+
     def update(self, events):
+        if self.playcount_thread and not self.playcount_thread.is_alive():
+            self.playcount_thread = None
+            self.gameObject.playable = self.gameObject.playable_count - self.playcount
+            self.set_playcount_text(f"플레이 가능 횟수: {self.gameObject.playable}회")
+            self.start_button.disabled = self.gameObject.playable == 0
         super().update(events)
         # star effect
         if pg.time.get_ticks() - self.last_star_creation > star_effect_delay:
-            self.add_item("stars", Star(randint(0, pg.display.get_window_size()[0]),
-                                        randint(0, pg.display.get_window_size()[1])))
+            self.add_item("stars", Star(randint(0, display.logical_size[0]),
+                                        randint(0, display.logical_size[1])))
             self.last_star_creation = pg.time.get_ticks()
 
 
@@ -376,8 +485,8 @@ class MenuGameTransition(Scene):
     def update(self, events):
         # star effect
         if pg.time.get_ticks() - self.last_star_creation > star_effect_delay:
-            self.add_item("stars", Star(randint(0, pg.display.get_window_size()[0]),
-                                        randint(0, pg.display.get_window_size()[1])))
+            self.add_item("stars", Star(randint(0, display.logical_size[0]),
+                                        randint(0, display.logical_size[1])))
             self.last_star_creation = pg.time.get_ticks()
         # main update
         for name, group in self.groups.copy().items():
@@ -388,7 +497,8 @@ class MenuGameTransition(Scene):
                 self.transitionFinishedTime = pg.time.get_ticks()
             elif pg.time.get_ticks() - self.transitionFinishedTime > self.transitionFinishDelay:
                 self.gameObject.change_scene(GameScene, {"inheritGroups": self.inherit_groups("stars"),
-                                                         "lastStarCreation": self.last_star_creation})
+                                                         "lastStarCreation": self.last_star_creation,
+                                                         "players": self.gameObject.players})
         elapsed_time = pg.time.get_ticks() - self.scene_start_time
         if "title" in self.groups.keys():
             for item in self.groups["title"]:
@@ -406,97 +516,120 @@ class MenuGameTransition(Scene):
 
 
 class GameScene(Scene):
+    frame_mode = "game"
+
     def __init__(self, gameObject, data):
         self.game = gameObject
         super().__init__()
-        self.started_time = pg.time.get_ticks()
         self.screen_color = Colors.BLACK.as_iter()
 
-        self.player = Player((gameObject.screen.get_width() // 2, gameObject.screen.get_height() // 2), Colors.BLUE)
-        self.create_group("player", self.player)
-
-        self.score_display_font = pg.font.Font(font_located('INVASION2000'), 60)
-        self.score_displayer = self.score_display_font.render("0", True, Colors.ORANGE.as_iter())
+        preloaded = data.get("preloaded") or self.warm(gameObject, self.preload(gameObject))
+        # data["players"] > 1 races local players on one enemy field, the first one is the signed-in student
+        self.simulation = DodgeSimulation(gameObject.screen.get_size(), randint(0, 2 ** 32 - 1),
+                                          clock=lambda: gameObject.time, difficulty=gameObject.difficulty,
+                                          players=data.get("players", 1))
+        self.started_time = self.simulation.started_time
+        self.player = self.simulation.player
+        # the ghost races single player games only and is drawn under the live player
+        self.ghost = preloaded.get("ghost")
+        if self.ghost and len(self.simulation.contestants) > 1:
+            self.ghost.close()
+            self.ghost = None
+        if self.ghost:
+            self.create_group("ghost", self.ghost.spawn(display.logical_size))
+        self.groups["player"] = self.simulation.players
+
+        self.score_display_font = preloaded["scoreDisplayFont"]
+        self.score_displayer = preloaded["scoreDisplayer"]
         self.add_raw_item(self.score_displayer, (gameObject.screen.get_width() / 2, gameObject.screen.get_height() / 8),
                           "score_displayer")
 
-        self.score = 0
-        self.summon_count = 0
-        self.last_summon_time = 0
-        self.lower_limit = 100
-
-        self.target_x_range = 50  # * 2
-        self.target_y_range = 50  # * 2
+        self.groups["enemy"] = self.simulation.enemies
 
-        self.create_group("enemy")
+        self.frame_stats = FrameStats()
+        self.last_frame_time = gameObject.time
+        telemetry.emit("game_start", difficulty=gameObject.difficulty, seed=self.simulation.seed,
+                       players=len(self.simulation.contestants))
 
         # for star effect
         self.groups["stars"] = data["inheritGroups"]["stars"]
         self.last_star_creation = data["lastStarCreation"]
 
+    @classmethod
+    def preload(cls, gameObject):
+        # the parsed difficulty and formations land in a shared cache, so warming it here is enough
+        load_difficulty(gameObject.difficulty)
+        load_formations()
+        return {"playerImage": Player.read_image() if Player.assets is None else None,
+                "ghost": Ghost.load(gameObject.difficulty)}
+
+    @classmethod
+    def warm(cls, gameObject, preloaded):
+        # the image decode, hitbox masks and collision tables, the score font and the ghost's see-through image
+        Player.load_assets(preloaded.pop("playerImage", None))
+        Ghost.translucent_image()
+        preloaded["scoreDisplayFont"] = load_font('INVASION2000', 60)
+        preloaded["scoreDisplayer"] = preloaded["scoreDisplayFont"].render("0", True, Colors.ORANGE.as_iter())
+        return preloaded
+
     def update(self, events):
         # star effect
         if pg.time.get_ticks() - self.last_star_creation > star_effect_delay:
-            self.add_item("stars", Star(randint(0, pg.display.get_window_size()[0]),
-                                        randint(0, pg.display.get_window_size()[1])))
+            self.add_item("stars", Star(randint(0, display.logical_size[0]),
+                                        randint(0, display.logical_size[1])))
             self.last_star_creation = pg.time.get_ticks()
         # main update
-        elapsed_time = pg.time.get_ticks() - self.started_time
-
-        def hit_test(item, offset):
-            return self.player.mask.overlap(item.mask, offset)
-
-        def normal_hit(item):
-            self.player.set_test_hitbox("normal_hitbox")
-            return hit_test(item, (self.player.rect.x - item.rect.x,
-                                   self.player.rect.y - item.rect.y))
-
-        def point_hit(item):
-            self.player.set_test_hitbox("point_hitbox")
-            return hit_test(item, (((self.player.rect.x - (self.player.point_hitbox_expand_x / 2)) - item.rect.x),
-                                   ((self.player.rect.y - (self.player.point_hitbox_expand_y / 2)) - item.rect.y)))
-
-        for item in self.groups["enemy"].sprites():
-            self.player.set_test_hitbox("normal_hitbox")
-            if normal_hit(item):
-                self.player.kill()
-                self.game.change_scene(ResultScene, {"inheritGroups": self.inherit_groups("enemy", "stars"),
-                                                     "elapsedTime": elapsed_time, "score": self.score,
-                                                     "totalScore": elapsed_time + self.score,
-                                                     "lastStarCreation": self.last_star_creation})
-            elif point_hit(item) and not item.counted:
-                item.counted = True
-                self.score += 2000
-
-        enemy_summon_delay_pattern = lambda x: -0.000005 * (x ** 2) + 500
-        summon_delay = enemy_summon_delay_pattern(elapsed_time)
-        if summon_delay <= self.lower_limit:
-            summon_delay = self.lower_limit
-        print(f"elapsed: {elapsed_time}, summon: {self.last_summon_time + summon_delay}, delay: {summon_delay}",
-              end="\r")
-
-        if elapsed_time > self.last_summon_time + summon_delay:
-            self.add_item("enemy", Enemy(
-                randint(-5, 5),
-                randint(-5, 5),
-                (
-                    randint(self.player.rect.x - self.target_x_range, self.player.rect.x + self.target_x_range),
-                    randint(self.player.rect.y - self.target_y_range, self.player.rect.y + self.target_y_range)
-                ),
-                True if randint(0, 1) == 1 else False,
-                True if randint(0, 1) == 1 else False,
-                self.game.screen.get_size(),
-                Colors.RED
-            ))
-            self.last_summon_time = elapsed_time
-
-        self.raws["score_displayer"][0] = self.score_display_font.render(str(elapsed_time), True,
-                                                                         Colors.ORANGE.as_iter())
+        # player and enemies are moved by the simulation, so only the stars are updated here
+        with profiler.section("update", "simulation"):
+            self.simulation.step(pg.key.get_pressed())
+        elapsed_time = self.simulation.elapsed_time
+        self.score = self.simulation.score
+        if self.ghost:
+            self.ghost.advance(elapsed_time)
+        self.frame_stats.add(self.game.time - self.last_frame_time)
+        self.last_frame_time = self.game.time
+
+        if self.simulation.finished:
+            if self.ghost:
+                self.ghost.close()
+            result = self.simulation.result()
+            results = self.simulation.results()
+            telemetry.emit("game_end", difficulty=self.game.difficulty, time=result["time"], action=result["action"],
+                           score=result["score"], enemies=len(self.groups["enemy"]),
+                           frame_summary=self.frame_stats.summary(), **({"results": results} if len(results) > 1 else {}))
+            telemetry.flush()
+            self.game.change_scene(ResultScene, {"inheritGroups": self.inherit_groups("enemy", "stars"),
+                                                 "elapsedTime": result["time"], "score": result["action"],
+                                                 "totalScore": result["score"], "results": results,
+                                                 "lastStarCreation": self.last_star_creation,
+                                                 "replay": self.simulation.recorder.dump()
+                                                 if self.simulation.recorder else None})
+            return
 
-        super().update(events)
+        with profiler.section("text"):
+            self.raws["score_displayer"][0] = self.score_display_font.render(str(elapsed_time), True,
+                                                                             Colors.ORANGE.as_iter())
+        profiler.count("surfaces")
+
+        with profiler.section("update", "stars"):
+            self.groups["stars"].update(events)
+        profiler.set_counter("sprites", len(self.groups["enemy"]), "enemy")
+        profiler.set_counter("sprites", len(self.groups["stars"]), "stars")
 
 
 class ResultScene(Scene):
+    attract_on_idle = True
+
+    @property
+    def frame_mode(self):
+        # the count-up and the upload run clock-locked, afterwards the screen only waits for a button
+        if self.transitioning or not self.animation_finished:
+            return "animated"
+        if not self.offline and (not self.thread_start or self.save_score_thread.is_alive()
+                                 or self.save_playcount_thread.is_alive()):
+            return "animated"
+        return "static"
+
     def __init__(self, gameObject, data):
         super().__init__()
         self.scene_start_time = pg.time.get_ticks()
@@ -509,16 +642,22 @@ class ResultScene(Scene):
         self.score = data["score"]  # action
         self.elapsed_time = data["elapsedTime"]  # time
         self.total_score = data["totalScore"]  # overall
+        self.replay = data.get("replay")
+        if self.replay:
+            # a new local best becomes the ghost of the following games
+            save_ghost(gameObject.difficulty, self.total_score, self.replay)
+        self.results = data.get("results") or [{"time": self.elapsed_time, "action": self.score,
+                                                 "score": self.total_score}]
 
         self.anim_current_score = 0
         self.anim_current_elapsed_time = 0
         self.anim_current_total_score = 0
 
-        button_font = pg.font.Font(font_located('One Mobile Bold'), 30)
+        button_font = load_font('One Mobile Bold', 30)
 
         title = Text(
             "Game Over",
-            pg.font.Font(font_located('BlackHanSans-Regular'), 40),
+            load_font('BlackHanSans-Regular', 40),
             Colors.ORANGE,
             (gameObject.screen.get_width() / 2, gameObject.screen.get_height() / 5),
             TextShadowEffect(Colors.ORANGE + Color(20, 20, 20), (2, 2)))
@@ -530,10 +669,10 @@ class ResultScene(Scene):
             Colors.RED - Color(100, 0, 0)
         ]
 
-        self.score_displayer_font = pg.font.Font(font_located('INVASION2000'), 40)
+        self.score_displayer_font = load_font('INVASION2000', 40)
         self.score_displayer = self.score_displayer_font.render("0", True, Colors.ORANGE.as_iter())
 
-        self.score_comment_font = pg.font.Font(font_located('BlackHanSans-Regular'), 40)
+        self.score_comment_font = load_font('BlackHanSans-Regular', 40)
         self.score_comment_overall = self.score_comment_font.render("총 점수", True,
                                                                     (Colors.RED - Color(50, 0, 0)).as_iter())
         self.score_comment_time = self.score_comment_font.render("시간 점수", True,
@@ -582,7 +721,8 @@ class ResultScene(Scene):
             BUTTON_COLOR,
             Text("다시하기", button_font, Colors.WHITE),
             ButtonEvent(gameObject, lambda gameObject: gameObject.change_scene(GameScene, {
-                "inheritGroups": self.inherit_groups("stars"), "lastStarCreation": self.last_star_creation})),
+                "inheritGroups": self.inherit_groups("stars"), "lastStarCreation": self.last_star_creation,
+                "players": len(self.results)})),
         )
 
         self.MenuBtn = Button(
@@ -602,6 +742,14 @@ class ResultScene(Scene):
             ButtonEvent(gameObject, lambda gameObject: gameObject.quit())
         )
 
+        if len(self.results) > 1:
+            # local multiplayer: everyone's total under the signed-in student's breakdown
+            self.add_raw_item(self.score_comment_font.render(
+                "   ".join(f"{index}P {result['score']}" for index, result in enumerate(self.results, 1)),
+                True, Colors.ORANGE.as_iter()),
+                (gameObject.screen.get_width() / 2, gameObject.screen.get_height() / 5 + 250),
+                "multiplayer_results")
+
         # element repositioning code
         # because of transition
         self.transitioning = True
@@ -619,43 +767,45 @@ class ResultScene(Scene):
         self.last_star_creation = data["lastStarCreation"]
 
         def save_score(time_score, action_score, overall_score):
+            requests = http()
             try:
-                season_req = requests.get(f"{gameObject.api_url}/get-season")
+                with telemetry.request("/get-season") as call:
+                    season_req = api_request(gameObject, "GET", "/get-season", retries=5)
+                    call.status = season_req.status_code
                 season = season_req.json()["season"]
 
-                res = requests.put(f"{gameObject.api_url}/put-score",
-                                   params={
-                                       "player_id": gameObject.student_id,
-                                       "key": gameObject.api_authkey,
-                                       "season": int(season),
-                                       "time": time_score,
-                                       "action": action_score,
-                                       "score": overall_score
-                                   })
+                with telemetry.request("/put-score") as call:
+                    res = api_request(gameObject, "PUT", "/put-score", retries=5,
+                                      params={
+                                          "player_id": gameObject.student_id,
+                                          "key": gameObject.api_authkey,
+                                          "season": int(season),
+                                          "time": time_score,
+                                          "action": action_score,
+                                          "score": overall_score
+                                      },
+                                      json={"replay": self.replay})
+                    call.status = res.status_code
                 print(res.text)
-            except Timeout as e:
+            except requests.Timeout as e:
                 print("Timeout")
 
-        def save_score_to_file(time_score, action_score, overall_score):
-            filename = f"session_{gameObject.student_grade}_{gameObject.student_class}_{gameObject.student_number}_{gameObject.session}.txt"
-            with open(filename, "a" if path.exists(filename) else "w") as f:
-                f.write(f"{datetime.now(tz=timezone(timedelta(hours=9))).strftime('%H:%M:%S')} {time_score} {action_score} {overall_score}")
-
         def save_playcount():
+            requests = http()
             try:
-                res = requests.put(f"{gameObject.api_url}/put-playcount",
-                                   params={
-                                       "player_id": gameObject.student_id,
-                                       "key": gameObject.api_authkey
-                                   })
+                with telemetry.request("/put-playcount") as call:
+                    res = api_request(gameObject, "PUT", "/put-playcount", retries=5,
+                                      params={
+                                          "player_id": gameObject.student_id,
+                                          "key": gameObject.api_authkey
+                                      })
+                    call.status = res.status_code
                 print(res.text)
-            except Timeout as e:
+            except requests.Timeout as e:
                 print("Timeout")
 
         if not gameObject.offline:
             self.save_score_thread = Thread(target=save_score, args=(self.elapsed_time, self.score, self.total_score))
-            self.save_to_file_thread = Thread(target=save_score_to_file,
-                                              args=(self.elapsed_time, self.score, self.total_score))
             self.save_playcount_thread = Thread(target=save_playcount)
             gameObject.playable -= 1 if gameObject.playable > 0 else 0
             self.QuitBtn.disabled = True
@@ -665,7 +815,7 @@ class ResultScene(Scene):
 
             thread_check_text = Text(
                 "점수를 저장하는 중입니다..",
-                pg.font.Font(font_located('BlackHanSans-Regular'), 27),
+                load_font('BlackHanSans-Regular', 27),
                 Colors.ORANGE,
                 (gameObject.screen.get_width() / 2, gameObject.screen.get_height() / 6 - 100),
                 TextShadowEffect(Colors.ORANGE + Color(20, 20, 20), (2, 2))
@@ -676,14 +826,13 @@ class ResultScene(Scene):
     def update(self, events):
         # star effect
         if pg.time.get_ticks() - self.last_star_creation > star_effect_delay:
-            self.add_item("stars", Star(randint(0, pg.display.get_window_size()[0]),
-                                        randint(0, pg.display.get_window_size()[1])))
+            self.add_item("stars", Star(randint(0, display.logical_size[0]),
+                                        randint(0, display.logical_size[1])))
             self.last_star_creation = pg.time.get_ticks()
         # thread check
         if not self.offline:
             if not self.thread_start:
                 self.save_score_thread.start()
-                self.save_to_file_thread.start()
                 self.save_playcount_thread.start()
                 self.thread_start = True
             if not self.save_score_thread.is_alive() and not self.save_playcount_thread.is_alive():
@@ -739,17 +888,24 @@ class ResultScene(Scene):
                     self.animation_finished = True
                     self.create_group("buttons", self.RestartBtn, self.MenuBtn, self.QuitBtn)
 
-            self.raws["score_displayer"][0] = self.score_displayer_font.render(f"{self.anim_current_total_score}", True,
-                                                                               Colors.ORANGE.as_iter())
+            with profiler.section("text"):
+                self.raws["score_displayer"][0] = self.score_displayer_font.render(f"{self.anim_current_total_score}", True,
+                                                                                   Colors.ORANGE.as_iter())
 
-            self.raws["score_splitted_time"][0] = self.score_displayer_font.render(f"{self.anim_current_elapsed_time}",
-                                                                                   True, Colors.ORANGE.as_iter())
+                self.raws["score_splitted_time"][0] = self.score_displayer_font.render(f"{self.anim_current_elapsed_time}",
+                                                                                       True, Colors.ORANGE.as_iter())
 
-            self.raws["score_splitted_barely_missed"][0] = self.score_displayer_font.render(
-                f"{self.anim_current_score}", True, Colors.ORANGE.as_iter())
+                self.raws["score_splitted_barely_missed"][0] = self.score_displayer_font.render(
+                    f"{self.anim_current_score}", True, Colors.ORANGE.as_iter())
+            profiler.count("surfaces", 3)
 
 
 class HowToPlayScene(Scene):
+    # kept by Game after the first visit, coming back only runs resume()
+    cacheable = True
+    frame_mode = "static"
+    attract_on_idle = True
+
     def __init__(self, gameObject, data):
         super().__init__()
         self.screen_color = Colors.WHITE.as_iter()
@@ -759,7 +915,7 @@ class HowToPlayScene(Scene):
             Colors.RED,
             Colors.RED - Color(100, 0, 0)
         ]
-        button_font = pg.font.Font(font_located('ONE Mobile Bold'), 20)
+        button_font = load_font('ONE Mobile Bold', 20)
 
         self.prevButton = Button((100, 25),
                                  (80, gameObject.screen.get_height() - 80),
@@ -779,76 +935,51 @@ class HowToPlayScene(Scene):
         self.page = 0
 
         self.fonts = {
-            "title": pg.font.Font(font_located('ONE Mobile Title'), 50),
-            "content": pg.font.Font(font_located('ONE Mobile Light'), 30)
+            "title": load_font('ONE Mobile Title', 50),
+            "content": load_font('ONE Mobile Light', 30)
         }
-        self.page_elements = [
+        # (font, text, center) per element, the Text objects are made the first time a page is shown
+        self.page_specs = [
             [
-                {
-                    "type": "text",
-                    "value": Text("게임 방법", self.fonts["title"], Colors.BLACK + Color(100, 100, 100),
-                                  (gameObject.screen.get_width() / 2, 50), TextShadowEffect(Colors.BLACK, (2, 2))),
-                },
-                {
-                    "type": "text",
-                    "value": Text("이 게임은 파란색 네모를 움직여", self.fonts["content"], Colors.BLACK + Color(100, 100, 100),
-                                  (210, 150), TextShadowEffect(Colors.BLACK, (2, 2))),
-                },
-                {
-                    "type": "text",
-                    "value": Text("빨간색 네모를 피하는 게임입니다.", self.fonts["content"], Colors.BLACK + Color(100, 100, 100),
-                                  (220, 220), TextShadowEffect(Colors.BLACK, (2, 2))),
-                }
+                ("title", "게임 방법", (gameObject.screen.get_width() / 2, 50)),
+                ("content", "이 게임은 파란색 네모를 움직여", (210, 150)),
+                ("content", "빨간색 네모를 피하는 게임입니다.", (220, 220)),
             ],
             [
-                {
-                    "type": "text",
-                    "value": Text("조작 방법", self.fonts["title"], Colors.BLACK + Color(100, 100, 100),
-                                  (gameObject.screen.get_width() / 2, 50), TextShadowEffect(Colors.BLACK, (2, 2))),
-                },
-                {
-                    "type": "text",
-                    "value": Text("W, A, S, D키로 움직입니다.", self.fonts["content"], Colors.BLACK + Color(100, 100, 100),
-                                  (190, 150), TextShadowEffect(Colors.BLACK, (2, 2))),
-                },
-                {
-                    "type": "text",
-                    "value": Text("LSHIFT 키를 눌러 더욱 빠르게 움직일 수 있습니다.", self.fonts["content"],
-                                  Colors.BLACK + Color(100, 100, 100), (330, 220),
-                                  TextShadowEffect(Colors.BLACK, (2, 2))),
-                }
+                ("title", "조작 방법", (gameObject.screen.get_width() / 2, 50)),
+                ("content", "W, A, S, D키로 움직입니다.", (190, 150)),
+                ("content", "LSHIFT 키를 눌러 더욱 빠르게 움직일 수 있습니다.", (330, 220)),
             ],
             [
+                ("title", "점수 방식", (gameObject.screen.get_width() / 2, 50)),
+                ("content", "MS 단위로 시간을 재 점수를 측정합니다.", (270, 150)),
+                ("content", "시간은 가장 기본적인 점수입니다.", (220, 220)),
+                ("content", "빨간색 네모를 피하면 점수가 잘 올라갑니다.", (280, 330)),
+                ("content", "그것을 \"액션 점수\"라고 합니다.", (200, 400)),
+            ]
+        ]
+        self.page_elements = {}
+        self.current_page_elements = []
+        self.create_group("currentPageElements")
+
+    def resume(self, data):
+        self.page = 0
+        self.current_page_elements = []
+        self.groups["currentPageElements"].empty()
+        for button in (self.prevButton, self.nextButton, self.quitHelpButton):
+            button.reset()
+
+    def get_page_elements(self, page):
+        if page not in self.page_elements:
+            self.page_elements[page] = [
                 {
                     "type": "text",
-                    "value": Text("점수 방식", self.fonts["title"], Colors.BLACK + Color(100, 100, 100),
-                                  (gameObject.screen.get_width() / 2, 50), TextShadowEffect(Colors.BLACK, (2, 2))),
-                },
-                {
-                    "type": "text",
-                    "value": Text("MS 단위로 시간을 재 점수를 측정합니다.", self.fonts["content"], Colors.BLACK + Color(100, 100, 100),
-                                  (270, 150), TextShadowEffect(Colors.BLACK, (2, 2))),
-                },
-                {
-                    "type": "text",
-                    "value": Text("시간은 가장 기본적인 점수입니다.", self.fonts["content"], Colors.BLACK + Color(100, 100, 100),
-                                  (220, 220), TextShadowEffect(Colors.BLACK, (2, 2))),
-                },
-                {
-                    "type": "text",
-                    "value": Text("빨간색 네모를 피하면 점수가 잘 올라갑니다.", self.fonts["content"],
-                                  Colors.BLACK + Color(100, 100, 100), (280, 330),
+                    "value": Text(text, self.fonts[font], Colors.BLACK + Color(100, 100, 100), center,
                                   TextShadowEffect(Colors.BLACK, (2, 2))),
-                },
-                {
-                    "type": "text",
-                    "value": Text("그것을 \"액션 점수\"라고 합니다.", self.fonts["content"], Colors.BLACK + Color(100, 100, 100),
-                                  (200, 400), TextShadowEffect(Colors.BLACK, (2, 2))),
                 }
+                for font, text, center in self.page_specs[page]
             ]
-        ]
-        self.current_page_elements = []
-        self.create_group("currentPageElements")
+        return self.page_elements[page]
 
     def update(self, events):
         super().update(events)
@@ -863,12 +994,13 @@ class HowToPlayScene(Scene):
 
             if self.page == 0:
                 self.create_group("startPageButtons", [self.nextButton, self.quitHelpButton])
-            elif self.page == len(self.page_elements) - 1:
+            elif self.page == len(self.page_specs) - 1:
                 self.create_group("endPageButtons", [self.prevButton, self.quitHelpButton])
             else:
                 self.create_group("middlePageButtons", [self.prevButton, self.nextButton, self.quitHelpButton])
 
-            for element in self.page_elements[self.page]:
+            self.current_page_elements = self.get_page_elements(self.page)
+            for element in self.current_page_elements:
                 self.add_item("currentPageElements", element["value"])
 
     def prev_page(self):
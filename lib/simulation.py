@@ -0,0 +1,244 @@
+from random import Random
+from functools import partial
+import pygame as pg
+
+from lib.object import Player, Enemy, Colors
+from lib.replay import ReplayRecorder, read_header, iter_frames, FLAG_SWEPT_COLLISION
+from lib.profiler import profiler
+from lib.difficulty import DifficultySchedule, load_difficulty
+from lib.pattern import load_formations
+
+# physical keys standing in for up, left, down, right and sprint of each local player
+KEY_BINDINGS = (
+    (pg.K_w, pg.K_a, pg.K_s, pg.K_d, pg.K_LSHIFT),
+    (pg.K_UP, pg.K_LEFT, pg.K_DOWN, pg.K_RIGHT, pg.K_RSHIFT),
+    (pg.K_i, pg.K_j, pg.K_k, pg.K_l, pg.K_SPACE),
+    (pg.K_KP8, pg.K_KP4, pg.K_KP5, pg.K_KP6, pg.K_KP0),
+)
+PLAYER_TINTS = (None, Colors.ORANGE, Colors.CYAN, Colors.PURPLE)
+
+
+class BoundKeys:
+    # one player's view of the keyboard, answering for the keys Player.update asks about
+    def __init__(self, binding):
+        self.keys = None
+        self.map = dict(zip((pg.K_w, pg.K_a, pg.K_s, pg.K_d, pg.K_LSHIFT), binding))
+
+    def __getitem__(self, key):
+        if key not in self.map:
+            return False
+        return self.keys[self.map[key]]
+
+
+class Contestant:
+    # a player of a simulation with its own action score and the time it survived
+    def __init__(self, index, player):
+        self.index = index
+        self.bit = 1 << index
+        self.player = player
+        self.alive = True
+        self.score = 0
+        self.elapsed_time = 0
+        self.previous_pos = player.rect.topleft
+
+    def result(self):
+        return {"time": self.elapsed_time, "action": self.score, "score": self.elapsed_time + self.score}
+
+
+class DodgeSimulation:
+    # the gameplay rules of GameScene without any rendering,
+    # shared by the game itself and by the server-side replay verifier
+    def __init__(self, screen_size, seed, clock:callable=pg.time.get_ticks, record=True, swept_collision=True,
+                 difficulty="default", players=1):
+        self.screen_size = screen_size
+        self.seed = seed
+        self.rng = Random(seed)
+        self.clock = clock
+        self.started_time = self.clock()
+        self.keys = None
+
+        # one player keeps the whole keyboard, local multiplayer splits it with KEY_BINDINGS.
+        # every player races on the same enemy field and the game ends when the last one is hit
+        if not 1 <= players <= len(KEY_BINDINGS):
+            raise ValueError(f"players must be between 1 and {len(KEY_BINDINGS)}")
+        self.contestants = []
+        for index in range(players):
+            if players == 1:
+                controls = lambda: self.keys
+            else:
+                bound_keys = BoundKeys(KEY_BINDINGS[index])
+                controls = partial(self.bound_keys, bound_keys)
+            center = (screen_size[0] * (index + 1) // (players + 1), screen_size[1] // 2)
+            self.contestants.append(Contestant(index, Player(center, Colors.BLUE, clock=self.clock, controls=controls,
+                                                             tint=PLAYER_TINTS[index])))
+        self.player = self.contestants[0].player
+        self.players = pg.sprite.Group(contestant.player for contestant in self.contestants)
+        self.enemies = pg.sprite.Group()
+        # swept collision tests the whole path moved since the last check instead of the end positions only,
+        # so fast enemies and sprinting can not skip over a hit when frames stall
+        self.swept_collision = swept_collision
+
+        self.elapsed_time = 0
+        self.last_summon_time = 0
+
+        # spawn delay, enemy speed and aim spread over time come from a precomputed difficulty profile
+        self.difficulty = difficulty if isinstance(difficulty, DifficultySchedule) else load_difficulty(difficulty)
+        self.formations = load_formations() if self.difficulty.waves else {}
+        self.wave_cursor = 0
+        self.bounds = pg.Rect(-20, -20, screen_size[0] + 40, screen_size[1] + 40)
+
+        self.finished = False
+        # replays hold one player's keys, so only single player games are recorded
+        self.recorder = ReplayRecorder(seed, screen_size, self.started_time,
+                                       FLAG_SWEPT_COLLISION if swept_collision else 0,
+                                       self.difficulty.name) if record and players == 1 else None
+
+    @property
+    def score(self):
+        return self.contestants[0].score
+
+    def bound_keys(self, bound_keys):
+        bound_keys.keys = self.keys
+        return bound_keys
+
+    def alive(self):
+        return [contestant for contestant in self.contestants if contestant.alive]
+
+    def target(self, alive):
+        # with one player left the rng is not touched, so single player runs stay replay compatible
+        return (alive[0] if len(alive) == 1 else self.rng.choice(alive)).player
+
+    def summon_delay(self, elapsed_time):
+        return self.difficulty.spawn_delay(elapsed_time)
+
+    def normal_hit(self, item):
+        return self.player.collision_tables["normal_hitbox"].test(self.player.rect.x - item.rect.x,
+                                                                  self.player.rect.y - item.rect.y)
+
+    def point_hit(self, item):
+        return self.player.collision_tables["point_hitbox"].test(self.player.rect.x - item.rect.x,
+                                                                 self.player.rect.y - item.rect.y)
+
+    def collision_check(self):
+        # every enemy is tested against every living player in one pass over the field,
+        # a hit player stops scoring near misses for the rest of the pass
+        contestants = [(contestant, contestant.bit, contestant.player.rect.x, contestant.player.rect.y,
+                        contestant.player.collision_tables["normal_hitbox"].test,
+                        contestant.player.collision_tables["point_hitbox"].test) for contestant in self.alive()]
+        for item in self.enemies.sprites():
+            for contestant, bit, player_x, player_y, normal_test, point_test in contestants:
+                if not contestant.alive:
+                    continue
+                dx = player_x - item.rect.x
+                dy = player_y - item.rect.y
+                if normal_test(dx, dy):
+                    contestant.alive = False
+                elif not item.counted & bit and point_test(dx, dy):
+                    item.counted |= bit
+                    contestant.score += 2000
+
+    def swept_collision_check(self):
+        # enemies move on their straight tilt line, so the offset between player and enemy
+        # changes linearly between two checks and the segment between the offsets is tested
+        contestants = []
+        for contestant in self.alive():
+            player_x0, player_y0 = contestant.previous_pos
+            player_x1, player_y1 = contestant.previous_pos = contestant.player.rect.topleft
+            contestants.append((contestant, contestant.bit, player_x0, player_y0, player_x1, player_y1,
+                                contestant.player.collision_tables["normal_hitbox"].sweep,
+                                contestant.player.collision_tables["point_hitbox"].sweep))
+        for item in self.enemies.sprites():
+            enemy_x0, enemy_y0 = item.previous_pos
+            enemy_x1, enemy_y1 = item.previous_pos = item.rect.topleft
+            for contestant, bit, player_x0, player_y0, player_x1, player_y1, normal_sweep, point_sweep in contestants:
+                if not contestant.alive:
+                    continue
+                dx0 = player_x0 - enemy_x0
+                dy0 = player_y0 - enemy_y0
+                dx1 = player_x1 - enemy_x1
+                dy1 = player_y1 - enemy_y1
+                if normal_sweep(dx0, dy0, dx1, dy1):
+                    contestant.alive = False
+                elif not item.counted & bit and point_sweep(dx0, dy0, dx1, dy1):
+                    item.counted |= bit
+                    contestant.score += 2000
+
+    def step(self, keys):
+        if self.finished:
+            return
+        now = self.clock()
+        self.keys = keys
+        if self.recorder:
+            self.recorder.record(now, keys)
+        self.elapsed_time = now - self.started_time
+
+        with profiler.section("collision"):
+            if self.swept_collision:
+                self.swept_collision_check()
+            else:
+                self.collision_check()
+        alive = []
+        for contestant in self.contestants:
+            if contestant.player.alive():
+                # still running or hit in this step, either way it lasted until now
+                contestant.elapsed_time = self.elapsed_time
+                if contestant.alive:
+                    alive.append(contestant)
+                else:
+                    contestant.player.kill()
+        if not alive:
+            self.finished = True
+            return
+
+        if self.elapsed_time > self.last_summon_time + self.summon_delay(self.elapsed_time):
+            target_range = int(self.difficulty.aim_spread(self.elapsed_time))  # * 2
+            target = self.target(alive)
+            enemy = Enemy(
+                self.rng.randint(-5, 5),
+                self.rng.randint(-5, 5),
+                (
+                    self.rng.randint(target.rect.x - target_range, target.rect.x + target_range),
+                    self.rng.randint(target.rect.y - target_range, target.rect.y + target_range)
+                ),
+                True if self.rng.randint(0, 1) == 1 else False,
+                True if self.rng.randint(0, 1) == 1 else False,
+                self.screen_size,
+                Colors.RED,
+                clock=self.clock,
+                rng=self.rng
+            )
+            enemy.change_multiply = int(self.difficulty.speed(self.elapsed_time))
+            self.enemies.add(enemy)
+            self.last_summon_time = self.elapsed_time
+
+        waves = self.difficulty.waves
+        while self.wave_cursor < len(waves) and waves[self.wave_cursor][0] <= self.elapsed_time:
+            formation = self.formations[waves[self.wave_cursor][1]]
+            self.enemies.add(formation.spawn(self.target(alive).rect.center, self.screen_size, self.rng,
+                                             self.bounds, self.clock))
+            self.wave_cursor += 1
+
+        self.players.update(None)
+        self.enemies.update(None)
+
+    def result(self):
+        return self.contestants[0].result()
+
+    def results(self):
+        return [contestant.result() for contestant in self.contestants]
+
+
+def simulate_replay(blob):
+    header = read_header(blob)
+    now = [0]
+    simulation = DodgeSimulation(header["screen_size"], header["seed"], clock=lambda: now[0], record=False,
+                                 swept_collision=bool(header["flags"] & FLAG_SWEPT_COLLISION),
+                                 difficulty=header["difficulty"])
+    for frame_time, keys in iter_frames(blob):
+        now[0] = frame_time
+        simulation.step(keys)
+        if simulation.finished:
+            break
+    result = simulation.result()
+    result["finished"] = simulation.finished
+    return result
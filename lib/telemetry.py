@@ -0,0 +1,225 @@
+from argparse import ArgumentParser
+from os import path, makedirs, listdir, replace
+from pathlib import Path
+from secrets import token_hex
+from threading import Lock
+from time import time, perf_counter, strftime
+import json
+
+BASEDIR = Path(__file__).parent.parent.absolute()
+TELEMETRY_DIR = path.join(BASEDIR, 'telemetry')
+CURRENT_SEGMENT = 'current.jsonl'
+
+# frame times above this are counted as dropped frames in the per-game summary
+SLOW_FRAME_MS = 1000 / 30
+
+
+class FrameStats:
+    # running frame-time summary of one game, a 1 ms histogram instead of keeping every frame
+    def __init__(self, buckets=100):
+        self.frames = 0
+        self.total = 0
+        self.worst = 0
+        self.slow = 0
+        self.histogram = [0] * (buckets + 1)
+
+    def add(self, frame_ms):
+        self.frames += 1
+        self.total += frame_ms
+        if frame_ms > self.worst:
+            self.worst = frame_ms
+        if frame_ms > SLOW_FRAME_MS:
+            self.slow += 1
+        bucket = int(frame_ms)
+        self.histogram[bucket if bucket < len(self.histogram) else -1] += 1
+
+    def percentile(self, fraction):
+        wanted = self.frames * fraction
+        seen = 0
+        for bucket, count in enumerate(self.histogram):
+            seen += count
+            if seen >= wanted:
+                return bucket
+        return len(self.histogram) - 1
+
+    def summary(self):
+        if not self.frames:
+            return {"frames": 0}
+        return {"frames": self.frames, "mean_ms": round(self.total / self.frames, 2),
+                "p95_ms": self.percentile(0.95), "max_ms": self.worst, "slow": self.slow}
+
+
+class _TimedRequest:
+    def __init__(self, telemetry, endpoint):
+        self.telemetry = telemetry
+        self.endpoint = endpoint
+        self.status = None
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.telemetry.emit("network", endpoint=self.endpoint, status=self.status,
+                            latency_ms=round((perf_counter() - self.start) * 1000, 1),
+                            error=exc_type.__name__ if exc_type else None)
+        return False
+
+
+class TelemetryWriter:
+    # buffered, append-only JSON lines. records are written in batches and the active segment
+    # is renamed to a timestamped file once it grows past max_bytes, old segments are never rewritten.
+    def __init__(self, directory=TELEMETRY_DIR, max_bytes=1024 * 1024, buffer_size=32):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.buffer_size = buffer_size
+        self.buffer = []
+        self.context = {}
+        self.lock = Lock()
+
+    def configure(self, directory):
+        self.flush()
+        self.directory = directory
+
+    def set_context(self, **fields):
+        # fields added to every following record, e.g. the session token and player id
+        self.context.update(fields)
+
+    def emit(self, kind, **fields):
+        record = {"ts": int(time() * 1000), "kind": kind}
+        record.update(self.context)
+        record.update(fields)
+        line = json.dumps(record, ensure_ascii=False, separators=(",", ":"))
+        with self.lock:
+            self.buffer.append(line)
+            if len(self.buffer) >= self.buffer_size:
+                self._write()
+
+    def request(self, endpoint):
+        # with telemetry.request("/put-score") as call: res = requests.put(...); call.status = res.status_code
+        return _TimedRequest(self, endpoint)
+
+    def flush(self):
+        with self.lock:
+            self._write()
+
+    def _write(self):
+        if not self.buffer:
+            return
+        makedirs(self.directory, exist_ok=True)
+        current = path.join(self.directory, CURRENT_SEGMENT)
+        with open(current, "a", encoding="utf-8") as f:
+            f.write("\n".join(self.buffer) + "\n")
+            size = f.tell()
+        self.buffer.clear()
+        if size >= self.max_bytes:
+            replace(current, path.join(self.directory, f"{strftime('%Y%m%d-%H%M%S')}-{token_hex(4)}.jsonl"))
+
+
+def segments(directory=TELEMETRY_DIR):
+    # rotated segments sort by their timestamp, the active one is read last
+    if not path.isdir(directory):
+        return []
+    names = sorted(name for name in listdir(directory) if name.endswith(".jsonl") and name != CURRENT_SEGMENT)
+    if path.exists(path.join(directory, CURRENT_SEGMENT)):
+        names.append(CURRENT_SEGMENT)
+    return [path.join(directory, name) for name in names]
+
+
+def iter_records(directory=TELEMETRY_DIR, kinds=None):
+    # kinds filters on the raw line first so that unwanted records are never decoded
+    markers = [f'"kind":"{kind}"' for kind in kinds] if kinds else None
+    for segment in segments(directory):
+        with open(segment, "r", encoding="utf-8") as f:
+            for line in f:
+                if markers and not any(marker in line for marker in markers):
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    # a line cut short by a crash
+                    continue
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def aggregate(records, since=None):
+    sessions = set()
+    scores = {"time": [], "action": [], "score": []}
+    difficulties = {}
+    frames = {"frames": 0, "total_ms": 0, "max_ms": 0, "slow": 0}
+    latencies = {}
+    errors = {}
+    for record in records:
+        if since and record["ts"] < since:
+            continue
+        if record["kind"] == "game_end":
+            sessions.add(record.get("session"))
+            for key in scores:
+                scores[key].append(record[key])
+            difficulty = record.get("difficulty", "default")
+            difficulties[difficulty] = difficulties.get(difficulty, 0) + 1
+            summary = record.get("frame_summary", {})
+            if summary.get("frames"):
+                frames["frames"] += summary["frames"]
+                frames["total_ms"] += summary["mean_ms"] * summary["frames"]
+                frames["max_ms"] = max(frames["max_ms"], summary["max_ms"])
+                frames["slow"] += summary["slow"]
+        elif record["kind"] == "network":
+            endpoint = record["endpoint"]
+            latencies.setdefault(endpoint, []).append(record["latency_ms"])
+            if record.get("error") or (record.get("status") or 200) >= 400:
+                errors[endpoint] = errors.get(endpoint, 0) + 1
+
+    result = {"games": len(scores["score"]), "sessions": len(sessions), "difficulties": difficulties,
+              "scores": {}, "frames": {}, "network": {}}
+    for key, values in scores.items():
+        values.sort()
+        if values:
+            result["scores"][key] = {"mean": round(sum(values) / len(values), 1), "p50": percentile(values, 0.5),
+                                     "p90": percentile(values, 0.9), "max": values[-1]}
+    if frames["frames"]:
+        result["frames"] = {"frames": frames["frames"], "mean_ms": round(frames["total_ms"] / frames["frames"], 2),
+                            "max_ms": frames["max_ms"], "slow": frames["slow"]}
+    for endpoint, values in latencies.items():
+        values.sort()
+        result["network"][endpoint] = {"count": len(values), "errors": errors.get(endpoint, 0),
+                                       "p50_ms": percentile(values, 0.5), "p90_ms": percentile(values, 0.9),
+                                       "max_ms": values[-1]}
+    return result
+
+
+def main():
+    parser = ArgumentParser(description="DodgeGame telemetry summary")
+    parser.add_argument("--dir", default=TELEMETRY_DIR, help="telemetry directory")
+    parser.add_argument("--since", type=float, help="only records newer than this many hours")
+    parser.add_argument("--json", action="store_true", help="print the raw aggregate as json")
+    args = parser.parse_args()
+
+    since = int((time() - args.since * 3600) * 1000) if args.since else None
+    result = aggregate(iter_records(args.dir, ("game_end", "network")), since)
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+        return
+    print(f"{result['games']} games in {result['sessions']} sessions, "
+          + ", ".join(f"{name}: {count}" for name, count in sorted(result["difficulties"].items())))
+    for key, values in result["scores"].items():
+        print(f"{key:8} mean {values['mean']:>10} p50 {values['p50']:>8} p90 {values['p90']:>8} max {values['max']:>8}")
+    if result["frames"]:
+        frames = result["frames"]
+        print(f"frames   {frames['frames']} total, mean {frames['mean_ms']} ms, worst {frames['max_ms']} ms, "
+              f"{frames['slow']} slow")
+    for endpoint, values in sorted(result["network"].items()):
+        print(f"{endpoint:16} {values['count']:6} calls {values['errors']:4} errors "
+              f"p50 {values['p50_ms']:8.1f} ms p90 {values['p90_ms']:8.1f} ms max {values['max_ms']:8.1f} ms")
+
+
+telemetry = TelemetryWriter()
+
+
+if __name__ == "__main__":
+    main()